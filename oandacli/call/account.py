@@ -0,0 +1,389 @@
+#!/usr/bin/env python
+
+import json
+import logging
+import threading
+import time
+
+from ..util.logger import log_response
+from .streamer import StreamDriver
+
+
+class AccountState(object):
+    """In-memory account state kept current by transactions and prices.
+
+    Transactions received before load_snapshot() are held back and applied
+    afterwards, so a stream can be opened ahead of the REST snapshot without
+    losing events.  All reads are dictionary lookups under a lock.
+
+    Unrealized P&L is converted into the home currency with the price's
+    quoteHomeConversionFactors or, when the stream omits them, with factors
+    set by set_home_conversions().  Until either is known, a trade keeps the
+    unrealized P&L of the snapshot.
+    """
+
+    def __init__(self, on_new_instrument=None):
+        self.__lock = threading.Lock()
+        self.__on_new_instrument = on_new_instrument
+        self.__loaded = False
+        self.__pending = list()
+        self.__last_transaction_id = 0
+        self.__balance = 0.0
+        self.__pl = 0.0
+        self.__unrealized_pl = 0.0
+        self.__margin_used = 0.0
+        self.__trades = dict()
+        self.__inst_trade_ids = dict()
+        self.__positions = dict()
+        self.__prices = dict()
+        self.__home_conversions = dict()
+        self.__n_transactions = 0
+        self.__update_time = None
+
+    def load_snapshot(self, account, transactions=None):
+        with self.__lock:
+            self.__last_transaction_id = int(account['lastTransactionID'])
+            self.__balance = float(account['balance'])
+            self.__pl = float(account.get('pl') or 0)
+            self.__trades = dict()
+            self.__inst_trade_ids = dict()
+            self.__positions = dict()
+            self.__unrealized_pl = 0.0
+            self.__margin_used = 0.0
+            for t in (account.get('trades') or list()):
+                self._add_trade(
+                    trade_id=t['id'], instrument=t['instrument'],
+                    units=float(t['currentUnits']), price=float(t['price']),
+                    margin_used=float(t.get('marginUsed') or 0),
+                    unrealized_pl=float(t.get('unrealizedPL') or 0)
+                )
+            self.__loaded = True
+            pending = [*(transactions or list()), *self.__pending]
+            self.__pending = list()
+            for txn in pending:
+                self._apply_transaction(txn)
+            self.__update_time = time.time()
+
+    def apply_transaction(self, txn):
+        with self.__lock:
+            if self.__loaded:
+                self._apply_transaction(txn)
+                self.__update_time = time.time()
+            else:
+                self.__pending.append(txn)
+
+    def _apply_transaction(self, txn):
+        txn_id = int(txn['id'])
+        if txn_id <= self.__last_transaction_id:
+            return
+        self.__last_transaction_id = txn_id
+        self.__n_transactions += 1
+        if txn.get('accountBalance') is not None:
+            self.__balance = float(txn['accountBalance'])
+        if txn.get('pl') is not None:
+            self.__pl += float(txn['pl'])
+        if txn.get('type') == 'ORDER_FILL':
+            for tc in (txn.get('tradesClosed') or list()):
+                self._remove_trade(trade_id=tc['tradeID'])
+            if txn.get('tradeReduced'):
+                self._reduce_trade(
+                    trade_id=txn['tradeReduced']['tradeID'],
+                    units=float(txn['tradeReduced']['units'])
+                )
+            if txn.get('tradeOpened'):
+                to = txn['tradeOpened']
+                self._add_trade(
+                    trade_id=to['tradeID'], instrument=txn['instrument'],
+                    units=float(to['units']),
+                    price=float(to.get('price') or txn['price']),
+                    margin_used=float(to.get('initialMarginRequired') or 0)
+                )
+
+    def _add_trade(self, trade_id, instrument, units, price, margin_used=0.0,
+                   unrealized_pl=0.0):
+        self.__trades[trade_id] = {
+            'id': trade_id, 'instrument': instrument, 'units': units,
+            'price': price, 'marginUsed': margin_used,
+            'unrealizedPL': unrealized_pl
+        }
+        if not self.__inst_trade_ids.get(instrument):
+            self.__inst_trade_ids[instrument] = set()
+            if self.__on_new_instrument:
+                self.__on_new_instrument(instrument)
+        self.__inst_trade_ids[instrument].add(trade_id)
+        self.__margin_used += margin_used
+        self._update_position(instrument=instrument)
+
+    def _remove_trade(self, trade_id):
+        trade = self.__trades.pop(trade_id, None)
+        if trade:
+            self.__inst_trade_ids[trade['instrument']].discard(trade_id)
+            self.__margin_used -= trade['marginUsed']
+            self._update_position(instrument=trade['instrument'])
+
+    def _reduce_trade(self, trade_id, units):
+        trade = self.__trades.get(trade_id)
+        if trade:
+            ratio = (trade['units'] + units) / trade['units']
+            self.__margin_used -= trade['marginUsed'] * (1 - ratio)
+            trade['marginUsed'] *= ratio
+            trade['unrealizedPL'] *= ratio
+            trade['units'] += units
+            self._update_position(instrument=trade['instrument'])
+
+    def _update_position(self, instrument):
+        trades = [
+            self.__trades[i]
+            for i in self.__inst_trade_ids.get(instrument, set())
+        ]
+        old = self.__positions.pop(instrument, None)
+        if old:
+            self.__unrealized_pl -= old['unrealizedPL']
+        if trades:
+            price = self.__prices.get(instrument)
+            factors = price and (
+                price.get('factors')
+                or self.__home_conversions.get(instrument.split('_')[-1])
+            )
+            if factors:
+                for t in trades:
+                    t['unrealizedPL'] = _mark_trade(
+                        trade=t, price=price, factors=factors
+                    )
+            pos = {
+                'instrument': instrument,
+                'longUnits': sum(t['units'] for t in trades if t['units'] > 0),
+                'shortUnits': sum(
+                    t['units'] for t in trades if t['units'] < 0
+                ),
+                'marginUsed': sum(t['marginUsed'] for t in trades),
+                'unrealizedPL': sum(t['unrealizedPL'] for t in trades)
+            }
+            self.__positions[instrument] = pos
+            self.__unrealized_pl += pos['unrealizedPL']
+
+    def mark_price(self, price):
+        instrument = price['instrument']
+        with self.__lock:
+            self.__prices[instrument] = {
+                'bid': float(price['closeoutBid']),
+                'ask': float(price['closeoutAsk']),
+                'factors': {
+                    k: float(v) for k, v
+                    in (price.get('quoteHomeConversionFactors') or {}).items()
+                }
+            }
+            if self.__inst_trade_ids.get(instrument):
+                self._update_position(instrument=instrument)
+
+    def set_home_conversions(self, home_conversions):
+        with self.__lock:
+            for c in home_conversions:
+                self.__home_conversions[c['currency']] = {
+                    'positiveUnits': float(c['accountGain']),
+                    'negativeUnits': float(c['accountLoss'])
+                }
+            for i in [k for k, v in self.__inst_trade_ids.items() if v]:
+                self._update_position(instrument=i)
+
+    def summary(self):
+        with self.__lock:
+            nav = self.__balance + self.__unrealized_pl
+            return {
+                'balance': self.__balance, 'pl': self.__pl,
+                'unrealizedPL': self.__unrealized_pl, 'NAV': nav,
+                'marginUsed': self.__margin_used,
+                'marginAvailable': nav - self.__margin_used,
+                'openTradeCount': len(self.__trades),
+                'openPositionCount': len(self.__positions),
+                'lastTransactionID': str(self.__last_transaction_id),
+                'appliedTransactions': self.__n_transactions,
+                'updateTime': self.__update_time
+            }
+
+    def position(self, instrument):
+        with self.__lock:
+            pos = self.__positions.get(instrument)
+            return dict(pos) if pos else None
+
+    def trade(self, trade_id):
+        with self.__lock:
+            trade = self.__trades.get(str(trade_id))
+            return dict(trade) if trade else None
+
+    def positions(self):
+        with self.__lock:
+            return {k: dict(v) for k, v in self.__positions.items()}
+
+    def trades(self):
+        with self.__lock:
+            return {k: dict(v) for k, v in self.__trades.items()}
+
+    def trade_instruments(self):
+        with self.__lock:
+            return {k for k, v in self.__inst_trade_ids.items() if v}
+
+
+def _mark_trade(trade, price, factors):
+    closeout = price['bid'] if trade['units'] > 0 else price['ask']
+    upl = (closeout - trade['price']) * trade['units']
+    return upl * factors['positiveUnits' if upl >= 0 else 'negativeUnits']
+
+
+class AccountStateDriver(StreamDriver):
+    """Stream driver feeding an AccountState.
+
+    The driver should own its API context: close() shuts the HTTP responses
+    opened on the context's session so that a replaced stream stops at once
+    instead of after its next message.
+    """
+
+    def __init__(self, api, account_id, state, target='transaction',
+                 instruments=None, ignore_api_error=False):
+        super().__init__(
+            api=api, account_id=account_id, target=target,
+            instruments=instruments, snapshot=True,
+            ignore_api_error=ignore_api_error, raw=True
+        )
+        self.__logger = logging.getLogger(__name__)
+        self.__state = state
+        self.__session = api._session
+        self.__responses = list()
+        self.__session.hooks['response'].append(
+            lambda r, *args, **kwargs: self.__responses.append(r)
+        )
+        self.connected = threading.Event()
+        self.closed = threading.Event()
+
+    def act(self, msg_type, msg):
+        self.connected.set()
+        if self.closed.is_set():
+            pass
+        elif msg_type.endswith('Heartbeat'):
+            pass
+        elif msg_type.startswith('transaction.'):
+            self.__state.apply_transaction(msg.data)
+        elif msg.instrument:
+            self.__state.mark_price(msg.data)
+
+    def close(self):
+        self.closed.set()
+        self.stop()
+        for r in self.__responses:
+            if hasattr(r.raw, 'shutdown'):
+                r.raw.shutdown()
+            r.close()
+        self.__session.close()
+
+    def shutdown(self):
+        self.connected.set()
+
+
+def watch_account(api, create_stream_api, account_id, instruments=None,
+                  interval=5, connect_timeout=10, conversion_interval=60,
+                  quiet=False):
+    assert account_id, 'account ID required'
+    logger = logging.getLogger(__name__)
+    logger.info('Account state tracking')
+    new_instrument = threading.Event()
+    state = AccountState(on_new_instrument=lambda i: new_instrument.set())
+    errors = list()
+    txn_driver = AccountStateDriver(
+        api=create_stream_api(), account_id=account_id, state=state,
+        target='transaction'
+    )
+    txn_thread = _start_driver_thread(driver=txn_driver, errors=errors)
+    if not txn_driver.connected.wait(timeout=float(connect_timeout)):
+        logger.warning('No transaction stream message before the snapshot')
+    res0 = api.account.get(accountID=account_id)
+    log_response(res0, logger=logger)
+    account = json.loads(res0.raw_body)['account']
+    res1 = api.transaction.since(
+        accountID=account_id, id=account['lastTransactionID']
+    )
+    log_response(res1, logger=logger)
+    state.load_snapshot(
+        account=account,
+        transactions=json.loads(res1.raw_body).get('transactions')
+    )
+    price_driver = None
+    price_thread = None
+    priced = set()
+    next_print = time.monotonic()
+    next_conversion = time.monotonic()
+    try:
+        while True:
+            insts = {*(instruments or list()), *state.trade_instruments()}
+            if not insts <= priced:
+                logger.info(f'Stream prices:\t{sorted(insts)}')
+                if price_driver:
+                    price_driver.close()
+                price_driver = AccountStateDriver(
+                    api=create_stream_api(), account_id=account_id,
+                    state=state, target='pricing', instruments=sorted(insts)
+                )
+                price_thread = _start_driver_thread(
+                    driver=price_driver, errors=errors
+                )
+                priced = insts
+                next_conversion = time.monotonic()
+            if priced and time.monotonic() >= next_conversion:
+                state.set_home_conversions(
+                    _fetch_home_conversions(
+                        api=api, account_id=account_id, instruments=priced
+                    )
+                )
+                next_conversion = time.monotonic() + float(conversion_interval)
+            if errors:
+                raise errors[0]
+            elif not txn_thread.is_alive():
+                raise RuntimeError('transaction stream closed')
+            elif price_thread and not price_thread.is_alive():
+                raise RuntimeError('pricing stream closed')
+            if time.monotonic() >= next_print:
+                if not quiet:
+                    print(
+                        json.dumps({
+                            **state.summary(), 'positions': state.positions(),
+                            'trades': state.trades()
+                        }),
+                        flush=True
+                    )
+                next_print = time.monotonic() + float(interval)
+            new_instrument.wait(
+                timeout=max(
+                    min(next_print, next_conversion) - time.monotonic(), 0
+                )
+            )
+            new_instrument.clear()
+    finally:
+        for d in [txn_driver, price_driver]:
+            if d:
+                d.close()
+
+
+def _fetch_home_conversions(api, account_id, instruments):
+    logger = logging.getLogger(__name__)
+    res = api.pricing.get(
+        accountID=account_id, instruments=','.join(sorted(instruments)),
+        includeHomeConversions=True
+    )
+    log_response(res, logger=logger)
+    if not 100 <= res.status <= 399:
+        logger.warning(f'Home conversions not updated:\t{res.status}')
+        return list()
+    else:
+        return json.loads(res.raw_body).get('homeConversions') or list()
+
+
+def _start_driver_thread(driver, errors):
+    def run():
+        try:
+            driver.invoke()
+        except Exception as e:
+            if not driver.closed.is_set():
+                errors.append(e)
+
+    th = threading.Thread(target=run, daemon=True)
+    th.start()
+    return th
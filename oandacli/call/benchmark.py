@@ -0,0 +1,157 @@
+#!/usr/bin/env python
+
+import json
+import logging
+import os
+import subprocess
+import sys
+import time
+from itertools import product
+from pathlib import Path
+from tempfile import TemporaryDirectory
+
+import pandas as pd
+import redis
+import yaml
+
+from ..util.mockserver import MockV20Server
+
+CURRENCIES = [
+    'AUD', 'CAD', 'CHF', 'EUR', 'GBP', 'HKD', 'JPY', 'NZD', 'SGD', 'USD'
+]
+
+
+def run_benchmark(n_ticks=20000, n_transactions=5000, max_instruments=64,
+                  use_redis=False, redis_host='127.0.0.1', redis_port=6379,
+                  redis_db=0, print_json=False):
+    logger = logging.getLogger(__name__)
+    logger.info('Benchmark')
+    instruments = [
+        f'{a}_{b}' for a, b in product(CURRENCIES, CURRENCIES) if a < b
+    ][:int(max_instruments)]
+    server = MockV20Server(
+        n_ticks=int(n_ticks), n_transactions=int(n_transactions),
+        instruments=instruments
+    )
+    server.start_in_thread()
+    logger.info(f'Mock v20 server:\t{server.url}')
+    results = list()
+    try:
+        with TemporaryDirectory() as d:
+            tmp = Path(d)
+            config_yml = tmp.joinpath('oanda.yml')
+            with open(config_yml, 'w') as f:
+                yaml.dump(
+                    {
+                        'oanda': {
+                            'environment': 'practice', 'token': 'mock',
+                            'account_id': server.account_ids[0],
+                            'hostname': server.server_address[0],
+                            'port': server.server_address[1], 'ssl': False
+                        }
+                    }, f
+                )
+            r = _run_cli(argv=['--version'], config_yml=config_yml, tmp=tmp)
+            results.append({'benchmark': 'startup', 'instruments': 0, **r})
+            startup_sec = r['wall_sec']
+            n_insts = sorted({
+                n for n in [1, 4, 16, 64, len(instruments)]
+                if n <= len(instruments)
+            })
+            for n in n_insts:
+                results.append({
+                    'benchmark': 'track', 'instruments': n,
+                    **_run_cli(
+                        argv=[
+                            'track', '--quiet', '--count=5000',
+                            f'--sqlite={tmp.joinpath(f"track.{n}.db")}',
+                            *instruments[:n]
+                        ],
+                        config_yml=config_yml, tmp=tmp
+                    )
+                })
+            sinks = {
+                'stdout': [],
+                'csv': ['--quiet', f'--csv={tmp.joinpath("stream.csv")}'],
+                'sqlite': ['--quiet', f'--sqlite={tmp.joinpath("stream.db")}']
+            }
+            if use_redis:
+                redis.StrictRedis(
+                    host=redis_host, port=int(redis_port), db=int(redis_db)
+                ).ping()
+                sinks['redis'] = [
+                    '--quiet', '--use-redis', f'--redis-host={redis_host}',
+                    f'--redis-port={redis_port}', f'--redis-db={redis_db}'
+                ]
+            for k, v in sinks.items():
+                r = _run_cli(
+                    argv=['stream', *v, *instruments[:4]],
+                    config_yml=config_yml, tmp=tmp
+                )
+                results.append({
+                    'benchmark': f'stream:{k}', 'instruments': 4, **r,
+                    'per_sec': _per_sec(
+                        n=server.n_ticks, wall_sec=r['wall_sec'],
+                        startup_sec=startup_sec
+                    )
+                })
+            txn_db = tmp.joinpath('transaction.db')
+            r = _run_cli(
+                argv=['transaction', '--quiet', f'--sqlite={txn_db}'],
+                config_yml=config_yml, tmp=tmp
+            )
+            results.append({
+                'benchmark': 'transaction', 'instruments': len(instruments),
+                **r,
+                'per_sec': _per_sec(
+                    n=server.n_transactions, wall_sec=r['wall_sec'],
+                    startup_sec=startup_sec
+                )
+            })
+            results.append({
+                'benchmark': 'plotpl', 'instruments': len(instruments),
+                **_run_cli(
+                    argv=['plotpl', str(txn_db), str(tmp.joinpath('pl.png'))],
+                    config_yml=config_yml, tmp=tmp
+                )
+            })
+    finally:
+        server.shutdown()
+        server.server_close()
+    if print_json:
+        print(json.dumps(results, indent=2))
+    else:
+        with pd.option_context('display.max_rows', None):
+            print(pd.DataFrame(results).set_index('benchmark'))
+    return results
+
+
+def _per_sec(n, wall_sec, startup_sec):
+    return n / max(wall_sec - startup_sec, 1e-3)
+
+
+def _run_cli(argv, config_yml, tmp):
+    logger = logging.getLogger(__name__)
+    logger.info('Run:\toanda-cli ' + ' '.join(argv))
+    t_start = time.perf_counter()
+    proc = subprocess.Popen(
+        [
+            sys.executable, '-c', 'from oandacli.cli.main import main; main()',
+            *argv
+        ],
+        cwd=str(tmp), env={**os.environ, 'OANDA_YML': str(config_yml)},
+        stdout=subprocess.DEVNULL
+    )
+    _, status, rusage = os.wait4(proc.pid, 0)
+    wall_sec = time.perf_counter() - t_start
+    proc.returncode = (
+        os.WEXITSTATUS(status) if os.WIFEXITED(status)
+        else -os.WTERMSIG(status)
+    )
+    if proc.returncode != 0:
+        raise subprocess.CalledProcessError(proc.returncode, proc.args)
+    return {
+        'wall_sec': wall_sec,
+        'cpu_sec': rusage.ru_utime + rusage.ru_stime,
+        'peak_rss_mb': rusage.ru_maxrss / 1024
+    }
@@ -32,68 +32,11 @@ def track_rate(api, instruments, granularity, count, csv_dir_path=None,
         pd.DataFrame(c).assign(instrument=i) for i, c in candles.items()
     ]).drop(columns=['complete']).set_index(keys)
     if csv_dir_path:
-        csv_dir = Path(csv_dir_path).resolve()
-        if not csv_dir.is_dir():
-            csv_dir.mkdir()
-        df_all_day = df_all.reset_index().assign(
-            datetime=lambda d: pd.to_datetime(d['time'])
-        ).assign(
-            date=lambda d: d['datetime'].dt.date
+        write_candles_to_csv_dir(
+            df=df_all, csv_dir_path=csv_dir_path, granularity=granularity
         )
-        for t in df_all_day['date'].unique():
-            for i in df_all_day['instrument'].unique():
-                df_csv = df_all_day.pipe(
-                    lambda d:
-                    d[(d['date'] == t) & (d['instrument'] == i)]  # noqa: B023
-                ).drop(columns=['date', 'instrument'])
-                csv_path = str(
-                    csv_dir.joinpath(f'candle.{granularity}.{i}.{t}.csv')
-                )
-                if Path(csv_path).is_file():
-                    df_csv_new = df_csv.append(
-                        pd.read_csv(csv_path).assign(
-                            datetime=lambda d: pd.to_datetime(d['time'])
-                        )
-                    ).sort_values('datetime').drop(
-                        columns='datetime'
-                    ).drop_duplicates(
-                        subset=['time'], keep='last'
-                    ).set_index('time')
-                else:
-                    df_csv_new = df_csv.sort_values('datetime').drop(
-                        columns='datetime'
-                    ).set_index('time')
-                df_csv_new.to_csv(csv_path, mode='w', header=True, sep=',')
     if sqlite_path:
-        logger.debug(f'df_all.shape:\t{df_all.shape}')
-        sqlite_file = Path(sqlite_path).resolve()
-        if sqlite_file.is_file():
-            with sqlite3.connect(str(sqlite_file)) as con:
-                df_db_diff = df_all.join(
-                    pdsql.read_sql(
-                        'SELECT instrument, time FROM candle;', con
-                    ).assign(
-                        in_db=True
-                    ).set_index(keys),
-                    on=keys, how='left'
-                ).pipe(
-                    lambda d: d[d['in_db'].isna()].drop(columns=['in_db'])
-                )
-                logger.debug(f'df_db_diff:{os.linesep}{df_db_diff}')
-                pdsql.to_sql(
-                    df_db_diff, name='candle', con=con, if_exists='append'
-                )
-        else:
-            schema_sql = Path(__file__).parent.parent.joinpath(
-                'static/create_tables.sql'
-            )
-            with sqlite3.connect(str(sqlite_file)) as con:
-                with open(schema_sql, 'r') as f:
-                    con.executescript(f.read())
-                logger.debug(f'df_all:{os.linesep}{df_all}')
-                pdsql.to_sql(
-                    df_all, name='candle', con=con, if_exists='append'
-                )
+        write_candles_to_sqlite(df=df_all, sqlite_path=sqlite_path)
     if not quiet:
         if print_json:
             print(json.dumps(candles, indent=2))
@@ -102,6 +45,98 @@ def track_rate(api, instruments, granularity, count, csv_dir_path=None,
                 print(df_all)
 
 
+def write_candles_to_csv_dir(df, csv_dir_path, granularity):
+    csv_dir = Path(csv_dir_path).resolve()
+    if not csv_dir.is_dir():
+        csv_dir.mkdir()
+    df_all_day = df.reset_index().assign(
+        datetime=lambda d: pd.to_datetime(d['time'])
+    ).assign(
+        date=lambda d: d['datetime'].dt.date
+    )
+    for t in df_all_day['date'].unique():
+        for i in df_all_day['instrument'].unique():
+            df_csv = df_all_day.pipe(
+                lambda d:
+                d[(d['date'] == t) & (d['instrument'] == i)]  # noqa: B023
+            ).drop(columns=['date', 'instrument'])
+            if df_csv.size == 0:
+                continue
+            csv_path = str(
+                csv_dir.joinpath(f'candle.{granularity}.{i}.{t}.csv')
+            )
+            if Path(csv_path).is_file():
+                df_csv_new = pd.concat([
+                    df_csv,
+                    pd.read_csv(csv_path).assign(
+                        datetime=lambda d: pd.to_datetime(d['time'])
+                    )
+                ]).sort_values('datetime').drop(
+                    columns='datetime'
+                ).drop_duplicates(
+                    subset=['time'], keep='last'
+                ).set_index('time')
+            else:
+                df_csv_new = df_csv.sort_values('datetime').drop(
+                    columns='datetime'
+                ).set_index('time')
+            df_csv_new.to_csv(csv_path, mode='w', header=True, sep=',')
+
+
+def write_candles_to_sqlite(df, sqlite_path, table='candle'):
+    logger = logging.getLogger(__name__)
+    keys = ['instrument', 'time']
+    logger.debug(f'df.shape:\t{df.shape}')
+    sqlite_file = Path(sqlite_path).resolve()
+    if sqlite_file.is_file():
+        with sqlite3.connect(str(sqlite_file)) as con:
+            _create_candle_table(con=con, table=table)
+            df_db_diff = df.join(
+                pdsql.read_sql(
+                    f'SELECT instrument, time FROM {table};', con
+                ).assign(
+                    in_db=True
+                ).set_index(keys),
+                on=keys, how='left'
+            ).pipe(
+                lambda d: d[d['in_db'].isna()].drop(columns=['in_db'])
+            )
+            logger.debug('df_db_diff:%s%s', os.linesep, df_db_diff)
+            pdsql.to_sql(df_db_diff, name=table, con=con, if_exists='append')
+    else:
+        schema_sql = Path(__file__).parent.parent.joinpath(
+            'static/create_tables.sql'
+        )
+        with sqlite3.connect(str(sqlite_file)) as con:
+            with open(schema_sql, 'r') as f:
+                con.executescript(f.read())
+            _create_candle_table(con=con, table=table)
+            logger.debug('df:%s%s', os.linesep, df)
+            pdsql.to_sql(df, name=table, con=con, if_exists='append')
+
+
+def _create_candle_table(con, table):
+    names = {
+        r[0] for r in con.execute(
+            'SELECT name FROM sqlite_master WHERE type = \'table\';'
+        )
+    }
+    if table not in names:
+        logging.getLogger(__name__).info(f'Create a table:\t{table}')
+        if 'candle' not in names:
+            schema_sql = Path(__file__).parent.parent.joinpath(
+                'static/create_tables.sql'
+            )
+            with open(schema_sql, 'r') as f:
+                con.executescript(f.read())
+        if table != 'candle':
+            con.execute(
+                con.execute(
+                    'SELECT sql FROM sqlite_master WHERE name = \'candle\';'
+                ).fetchone()[0].replace('candle', table, 1)
+            )
+
+
 def _candlestick2dict(candlestick):
     data_keys = ['bid', 'ask', 'mid']
     abbr = {'o': 'open', 'h': 'high', 'l': 'low', 'c': 'close'}
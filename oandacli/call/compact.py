@@ -0,0 +1,162 @@
+#!/usr/bin/env python
+
+import json
+import logging
+import sqlite3
+import time
+from pathlib import Path
+
+import pandas as pd
+
+ROLLUP_TIME_FORMATS = {'S1': (19, '.000000000Z'), 'M1': (16, ':00.000000000Z')}
+LEGACY_INDEXES = [
+    'ix_pricing_stream_time', 'ix_pricing_stream_inst',
+    'ix_transaction_stream_time', 'ix_transaction_stream_inst'
+]
+
+
+def compact_sqlite(sqlite_path, retention_days=7, rollup='M1',
+                   batch_size=10000, full_vacuum=False, quiet=False):
+    logger = logging.getLogger(__name__)
+    logger.info('SQLite compaction')
+    if rollup not in ROLLUP_TIME_FORMATS:
+        raise ValueError(f'invalid rollup:\t{rollup}')
+    sqlite_file = Path(sqlite_path).resolve()
+    assert sqlite_file.is_file(), f'file not found:\t{sqlite_file}'
+    cutoff = time.strftime(
+        '%Y-%m-%dT%H:%M:00.000000000Z',
+        time.gmtime(time.time() - float(retention_days) * 86400)
+    )
+    logger.info(f'Roll up ticks before:\t{cutoff}')
+    start = time.perf_counter()
+    report = {'path': str(sqlite_file), 'cutoff': cutoff, 'rollup': rollup}
+    with sqlite3.connect(str(sqlite_file), timeout=60) as con:
+        report['bytes_before'] = _fetch_db_size(con=con)
+        report['dropped_indexes'] = _migrate_schema(con=con)
+        report['instruments'] = {
+            i: _roll_up_ticks(
+                con=con, instrument=i, cutoff=cutoff, rollup=rollup,
+                batch_size=int(batch_size)
+            ) for i in [
+                r[0] for r in con.execute(
+                    'SELECT DISTINCT instrument FROM pricing_stream'
+                    ' ORDER BY 1;'
+                )
+            ]
+        }
+        report['freed_pages'] = _vacuum(con=con, full=full_vacuum)
+        logger.info('Update query planner statistics')
+        con.execute('ANALYZE;')
+        con.commit()
+        report['bytes_after'] = _fetch_db_size(con=con)
+    report['elapsed_sec'] = time.perf_counter() - start
+    if not quiet:
+        print(json.dumps(report, indent=2))
+    return report
+
+
+def _migrate_schema(con):
+    logger = logging.getLogger(__name__)
+    existing = {
+        r[0] for r in con.execute(
+            'SELECT name FROM sqlite_master WHERE type = \'index\';'
+        )
+    }
+    dropped = [n for n in LEGACY_INDEXES if n in existing]
+    for n in dropped:
+        logger.info(f'Drop an index:\t{n}')
+        con.execute(f'DROP INDEX {n};')
+    schema_sql = Path(__file__).parent.parent.joinpath(
+        'static/create_tables.sql'
+    )
+    with open(schema_sql, 'r') as f:
+        con.executescript(f.read())
+    return dropped
+
+
+def _roll_up_ticks(con, instrument, cutoff, rollup, batch_size):
+    logger = logging.getLogger(__name__)
+    n_chars, suffix = ROLLUP_TIME_FORMATS[rollup]
+    stat = {'deleted_ticks': 0, 'upserted_rows': 0}
+    while True:
+        rows = con.execute(
+            'SELECT rowid, time,'
+            ' COALESCE(json_extract(json, \'$.closeoutBid\'),'
+            ' json_extract(json, \'$.bids[0].price\')),'
+            ' COALESCE(json_extract(json, \'$.closeoutAsk\'),'
+            ' json_extract(json, \'$.asks[0].price\'))'
+            ' FROM pricing_stream WHERE instrument = ? AND time < ?'
+            ' ORDER BY time LIMIT ?;',
+            [instrument, cutoff, batch_size]
+        ).fetchall()
+        if not rows:
+            break
+        df_rollup = pd.DataFrame(
+            rows, columns=['rowid', 'time', 'bid', 'ask']
+        ).dropna().astype({'bid': float, 'ask': float}).assign(
+            bucket=lambda d: d['time'].str.slice(0, n_chars) + suffix
+        ).groupby('bucket', sort=True).agg(
+            count=('bid', 'size'),
+            openBid=('bid', 'first'), openAsk=('ask', 'first'),
+            highBid=('bid', 'max'), highAsk=('ask', 'max'),
+            lowBid=('bid', 'min'), lowAsk=('ask', 'min'),
+            closeBid=('bid', 'last'), closeAsk=('ask', 'last')
+        )
+        con.executemany(
+            'INSERT INTO pricing_rollup VALUES (?,?,?,?,?,?,?,?,?,?,?,?)'
+            ' ON CONFLICT(instrument, granularity, time) DO UPDATE SET'
+            ' count = count + excluded.count,'
+            ' highBid = MAX(highBid, excluded.highBid),'
+            ' highAsk = MAX(highAsk, excluded.highAsk),'
+            ' lowBid = MIN(lowBid, excluded.lowBid),'
+            ' lowAsk = MIN(lowAsk, excluded.lowAsk),'
+            ' closeBid = excluded.closeBid, closeAsk = excluded.closeAsk;',
+            [
+                (t, instrument, rollup, int(r[0]), *r[1:])
+                for t, r in zip(
+                    df_rollup.index, df_rollup.itertuples(index=False)
+                )
+            ]
+        )
+        con.executemany(
+            'DELETE FROM pricing_stream WHERE rowid = ?;',
+            [(r[0],) for r in rows]
+        )
+        con.commit()
+        stat['deleted_ticks'] += len(rows)
+        stat['upserted_rows'] += len(df_rollup)
+        logger.debug(f'{instrument}:\tdeleted ticks up to {rows[-1][1]}')
+    logger.info(f'{instrument}:\t{stat}')
+    return stat
+
+
+def _vacuum(con, full=False, pages_per_step=1000):
+    logger = logging.getLogger(__name__)
+    con.commit()
+    n_free = con.execute('PRAGMA freelist_count;').fetchone()[0]
+    if full:
+        logger.info('Rebuild the database with VACUUM')
+        con.execute('PRAGMA auto_vacuum = INCREMENTAL;')
+        con.execute('VACUUM;')
+        return n_free
+    elif con.execute('PRAGMA auto_vacuum;').fetchone()[0] != 2:
+        logger.warning(
+            'auto_vacuum is not INCREMENTAL (run once with --full-vacuum)'
+        )
+        return 0
+    else:
+        n_left = n_free
+        while n_left > 0:
+            con.execute(
+                f'PRAGMA incremental_vacuum({pages_per_step});'
+            ).fetchall()
+            n_left = con.execute('PRAGMA freelist_count;').fetchone()[0]
+            logger.debug(f'free pages left:\t{n_left}')
+        return n_free
+
+
+def _fetch_db_size(con):
+    return (
+        con.execute('PRAGMA page_count;').fetchone()[0]
+        * con.execute('PRAGMA page_size;').fetchone()[0]
+    )
@@ -6,11 +6,14 @@ import logging
 import pandas as pd
 import yaml
 
+from ..util.cache import fetch_accounts, fetch_instruments
+from ..util.fanout import map_accounts
 from ..util.logger import log_response
 
 
 def print_info(api, account_id=None, instruments=None, target='accounts',
-               print_json=False):
+               print_json=False, cache=None, refresh=False, account_ids=None,
+               max_workers=8):
     logger = logging.getLogger(__name__)
     available_targets = [
         'instruments', 'account', 'accounts', 'orders', 'trades', 'positions',
@@ -19,14 +22,49 @@ def print_info(api, account_id=None, instruments=None, target='accounts',
     if target not in available_targets:
         raise ValueError(f'invalid info target:\t{target}')
     logger.info('Information')
+    ids = account_ids or [account_id]
+    if len(ids) > 1 and target not in [
+            'accounts', 'order_book', 'position_book']:
+        data = map_accounts(
+            func=lambda a: _fetch_info(
+                api=api, account_id=a, instruments=instruments, target=target,
+                cache=cache, refresh=refresh
+            ),
+            account_ids=ids, max_workers=max_workers
+        )
+    else:
+        data = _fetch_info(
+            api=api, account_id=ids[0], instruments=instruments,
+            target=target, cache=cache, refresh=refresh
+        )
+    print(
+        json.dumps(data, indent=2) if print_json
+        else yaml.dump(data, default_flow_style=False).strip()
+    )
+
+
+def _fetch_info(api, account_id, instruments, target, cache=None,
+                refresh=False):
+    logger = logging.getLogger(__name__)
     arg_insts = {'instruments': ','.join(instruments)} if instruments else {}
     logger.debug(f'information target:\t{target}')
+    res = None
     if target == 'instruments':
-        res = api.account.instruments(accountID=account_id, **arg_insts)
+        data = fetch_instruments(
+            api=api, account_id=account_id, cache=cache, refresh=refresh
+        )
+        if instruments:
+            data = {
+                **data,
+                'instruments': [
+                    o for o in data['instruments']
+                    if o['name'] in instruments
+                ]
+            }
+    elif target == 'accounts':
+        data = fetch_accounts(api=api, cache=cache, refresh=refresh)
     elif target == 'account':
         res = api.account.get(accountID=account_id)
-    elif target == 'accounts':
-        res = api.account.list()
     elif target == 'orders':
         res = api.order.list_pending(accountID=account_id)
     elif target == 'trades':
@@ -43,25 +81,53 @@ def print_info(api, account_id=None, instruments=None, target='accounts',
         res = api.instrument.order_book(instrument=instruments[0])
     elif target == 'position_book':
         res = api.instrument.position_book(instrument=instruments[0])
-    log_response(res, logger=logger)
-    data = json.loads(res.raw_body)
-    print(
-        json.dumps(data, indent=2) if print_json
-        else yaml.dump(data, default_flow_style=False).strip()
-    )
+    if res is not None:
+        log_response(res, logger=logger)
+        data = json.loads(res.raw_body)
+    return data
 
 
 def print_spread_ratios(api, account_id, instruments=None, csv_path=None,
-                        quiet=False):
-    assert account_id, 'account ID required'
+                        quiet=False, cache=None, refresh=False,
+                        account_ids=None, max_workers=8):
+    ids = account_ids or [account_id]
+    assert all(ids), 'account ID required'
     logger = logging.getLogger(__name__)
     logger.info('Prices and Spread Ratios')
+    if len(ids) > 1:
+        df_spr = pd.concat(
+            map_accounts(
+                func=lambda a: _fetch_spread_ratios(
+                    api=api, account_id=a, instruments=instruments,
+                    cache=cache, refresh=refresh
+                ),
+                account_ids=ids, max_workers=max_workers
+            ),
+            names=['account_id']
+        )
+    else:
+        df_spr = _fetch_spread_ratios(
+            api=api, account_id=ids[0], instruments=instruments, cache=cache,
+            refresh=refresh
+        )
+    if csv_path:
+        df_spr.to_csv(csv_path)
+    if not quiet:
+        with pd.option_context('display.max_rows', None):
+            print(df_spr)
+
+
+def _fetch_spread_ratios(api, account_id, instruments=None, cache=None,
+                         refresh=False):
+    logger = logging.getLogger(__name__)
     if instruments:
         insts = instruments
     else:
-        res0 = api.account.instruments(accountID=account_id)
-        log_response(res0, logger=logger)
-        insts = [o['name'] for o in json.loads(res0.raw_body)['instruments']]
+        insts = [
+            o['name'] for o in fetch_instruments(
+                api=api, account_id=account_id, cache=cache, refresh=refresh
+            )['instruments']
+        ]
     res1 = api.pricing.get(accountID=account_id, instruments=','.join(insts))
     log_response(res1, logger=logger)
     df_spr = pd.DataFrame([
@@ -77,8 +143,4 @@ def print_spread_ratios(api, account_id, instruments=None, csv_path=None,
     ).assign(
         ratio_of_spread_to_mid=lambda d: (d['spread'] / d['mid'])
     ).set_index('instrument').sort_values('ratio_of_spread_to_mid')
-    if csv_path:
-        df_spr.to_csv(csv_path)
-    if not quiet:
-        with pd.option_context('display.max_rows', None):
-            print(df_spr)
+    return df_spr
@@ -31,7 +31,7 @@ def close_positions(api, account_id, instruments=None):
                 res = api.position.close(accountID=account_id, **pos)
                 log_response(res, logger=logger)
                 if 100 <= res.status <= 399:
-                    logger.debug(res.body)
+                    logger.debug('%s', res.body)
                 else:
                     raise RuntimeError(
                         'unexpected response:' + os.linesep + pformat(res.body)
@@ -45,7 +45,9 @@ def plot_pl(df_txn, path):
         {
             **{
                 k: o.get(k)
-                for k in ['time', 'instrument', 'accountBalance', 'pl']
+                for k in [
+                    'time', 'accountID', 'instrument', 'accountBalance', 'pl'
+                ]
             },
             'initialMarginRequired': (
                 o['tradeOpened'].get('initialMarginRequired')
@@ -60,12 +62,12 @@ def plot_pl(df_txn, path):
         }
     ).assign(
         time=lambda d: pd.to_datetime(d['time'])
-    )
-    logger.debug(f'df_pl:{os.linesep}{df_pl}')
+    ).sort_values('time')
+    logger.debug('df_pl:%s%s', os.linesep, df_pl)
     df_cumpl = df_pl.set_index(['instrument', 'time'])['pl'].unstack(
         level=0, fill_value=0
     ).cumsum().stack().to_frame('pl').reset_index()
-    logger.debug(f'df_cumpl:{os.linesep}{df_cumpl}')
+    logger.debug('df_cumpl:%s%s', os.linesep, df_cumpl)
 
     plt.rcParams['figure.figsize'] = (11.88, 8.40)  # A4 aspect: (297x210)
     sns.set(style='ticks', color_codes=True)
@@ -103,9 +105,19 @@ def plot_pl(df_txn, path):
         ylim=(0, df_pl['initialMarginRequired'].max() * ylim_ratio)
     )
 
-    axes[2].fill_between(
-        x='time', y1='accountBalance', color='lightsteelblue', data=df_pl
-    )
+    if df_pl['accountID'].nunique() > 1:
+        for a, d in df_pl.groupby('accountID'):
+            axes[2].plot(
+                'time', 'accountBalance', label=a, data=d, alpha=alpha,
+                drawstyle='steps-post'
+            )
+        axes[2].legend(
+            loc='upper left', bbox_to_anchor=(1.01, 1), title='account'
+        )
+    else:
+        axes[2].fill_between(
+            x='time', y1='accountBalance', color='lightsteelblue', data=df_pl
+        )
     axes[2].set(
         title='Account Balance', xlabel='time', ylabel='accountBalance',
         xlim=time_range, ylim=(0, df_pl['accountBalance'].max() * ylim_ratio)
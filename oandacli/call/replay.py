@@ -0,0 +1,214 @@
+#!/usr/bin/env python
+
+import heapq
+import json
+import logging
+import sqlite3
+import time
+from itertools import product
+from pathlib import Path
+from tempfile import TemporaryDirectory
+
+import pandas as pd
+import redis
+
+from .streamer import StreamRecorder, parse_stream_msg
+
+EXTS = {
+    'csv': tuple([f'.csv{s}' for s in ['', '.gz', '.bz2']]),
+    'tsv': tuple([
+        (a + b) for a, b in product(['.tsv', '.txt'], ['', '.gz', '.bz2'])
+    ]),
+    'sqlite': ('.sqlite3', '.sqlite', '.db')
+}
+
+
+def replay_stream(api, data_path, instruments=None, target='pricing',
+                  speed=0, csv_path=None, sqlite_path=None, use_redis=False,
+                  redis_host='127.0.0.1', redis_port=6379, redis_db=0,
+                  redis_max_llen=None, quiet=False):
+    assert data_path, 'data path required'
+    logger = logging.getLogger(__name__)
+    logger.info('Replaying')
+    if use_redis:
+        assert redis_host, 'redis_host required'
+        assert redis_port, 'redis_port required'
+        assert redis_db or redis_db == 0, 'redis_db required'
+    if use_redis and data_path.startswith('redis://'):
+        src = redis.StrictRedis.from_url(data_path).connection_pool
+        src_kw = src.connection_kwargs
+        if ((src_kw.get('host'), int(src_kw.get('port', 6379)),
+             int(src_kw.get('db', 0)))
+                == (redis_host, int(redis_port), int(redis_db))):
+            raise ValueError(f'source and sink are identical:\t{data_path}')
+    with TemporaryDirectory() as tmp_dir:
+        source_path = _index_stream_source(
+            data_path=data_path, target=target, tmp_dir=tmp_dir
+        )
+        insts = (
+            (
+                instruments or _list_stream_instruments(
+                    source_path=source_path, target=target
+                )
+            ) if target == 'pricing' else instruments
+        )
+        logger.debug(f'insts:\t{insts}')
+        recorder = StreamRecorder(
+            api=api, account_id=None, target=target, instruments=insts,
+            use_redis=use_redis, redis_host=redis_host,
+            redis_port=redis_port, redis_db=redis_db,
+            redis_max_llen=redis_max_llen, sqlite_path=sqlite_path,
+            csv_path=csv_path, quiet=quiet
+        )
+        records = heapq.merge(
+            *_read_stream_records(
+                source_path=source_path, target=target, instruments=insts
+            ),
+            key=lambda r: r[0]
+        )
+        try:
+            n_msgs = drive_replay(
+                driver=recorder, api=api, records=records, target=target,
+                speed=speed
+            )
+        finally:
+            recorder.shutdown()
+    logger.info(f'Replayed messages:\t{n_msgs}')
+
+
+def drive_replay(driver, api, records, target='pricing', speed=0):
+    """Feed time-ordered (time, instrument, json) records to driver.act().
+
+    With a speed of 0, records are replayed as fast as possible.  Otherwise,
+    the gaps between record times are divided by the speed multiplier.
+    """
+    speed = float(speed or 0)
+    t0 = None
+    w0 = None
+    n_msgs = 0
+    for t, _, msg_json_str in records:
+        if speed > 0:
+            ts = pd.Timestamp(t).value / 1e9
+            if t0 is None:
+                t0 = ts
+                w0 = time.monotonic()
+            else:
+                wait = w0 + (ts - t0) / speed - time.monotonic()
+                if wait > 0:
+                    time.sleep(wait)
+        driver.act(
+            *parse_stream_msg(
+                api=api, target=target, data=json.loads(msg_json_str)
+            )
+        )
+        n_msgs += 1
+    return n_msgs
+
+
+def _index_stream_source(data_path, target='pricing', tmp_dir=None,
+                         chunksize=10000):
+    """Return a Redis URL or SQLite path to read time-ordered records from.
+
+    CSV and TSV files are loaded once into a temporary SQLite database with
+    an (instrument, time) index, which sorts records that were appended out
+    of order (e.g., by several stream shards) without holding them in memory.
+    """
+    if data_path.startswith('redis://'):
+        return data_path
+    elif data_path.endswith(EXTS['sqlite']):
+        return data_path
+    elif data_path.endswith(EXTS['csv'] + EXTS['tsv']):
+        logger = logging.getLogger(__name__)
+        sqlite_path = str(Path(tmp_dir).joinpath('replay.db'))
+        logger.info(f'Index records:\t{data_path} => {sqlite_path}')
+        table = f'{target}_stream'
+        with sqlite3.connect(sqlite_path) as con:
+            con.execute(
+                f'CREATE TABLE {table}'
+                ' (time TEXT, instrument TEXT, json TEXT);'
+            )
+            for df in pd.read_csv(
+                    data_path, dtype=str, keep_default_na=False,
+                    sep=(',' if data_path.endswith(EXTS['csv']) else '\t'),
+                    chunksize=chunksize):
+                con.executemany(
+                    f'INSERT INTO {table} VALUES (?,?,?);',
+                    df[['time', 'instrument', 'json']].itertuples(
+                        index=False, name=None
+                    )
+                )
+            con.execute(
+                f'CREATE INDEX ix_{table} ON {table} (instrument, time);'
+            )
+            con.commit()
+        return sqlite_path
+    else:
+        raise ValueError(f'unsupported data source:\t{data_path}')
+
+
+def _list_stream_instruments(source_path, target='pricing'):
+    if source_path.startswith('redis://'):
+        redis_c = redis.StrictRedis.from_url(source_path)
+        return sorted(
+            k.decode() for k in redis_c.scan_iter()
+            if k != b'transactions' and redis_c.type(k) == b'list'
+        )
+    else:
+        with sqlite3.connect(source_path) as con:
+            return [
+                r[0] for r in con.execute(
+                    f'SELECT DISTINCT instrument FROM {target}_stream'
+                    ' ORDER BY 1;'
+                )
+            ]
+
+
+def _read_stream_records(source_path, target='pricing', instruments=None,
+                         chunksize=10000):
+    insts = (instruments or list()) if target == 'pricing' else [None]
+    if source_path.startswith('redis://'):
+        redis_c = redis.StrictRedis.from_url(source_path)
+        return [
+            _iterate_redis_records(
+                redis_c=redis_c, key=(i or 'transactions'),
+                chunksize=chunksize
+            ) for i in insts
+        ]
+    else:
+        return [
+            _iterate_sqlite_records(
+                path=source_path, table=f'{target}_stream', instrument=i,
+                chunksize=chunksize
+            ) for i in insts
+        ]
+
+
+def _iterate_redis_records(redis_c, key, chunksize=10000):
+    llen = redis_c.llen(key)
+    for i in range(0, llen, chunksize):
+        for v in redis_c.lrange(key, i, i + chunksize - 1):
+            d = json.loads(v)
+            yield (d['time'], d.get('instrument', ''), v.decode())
+
+
+def _iterate_sqlite_records(path, table, instrument=None, chunksize=10000):
+    con = sqlite3.connect(path)
+    try:
+        if instrument:
+            cur = con.execute(
+                f'SELECT time, instrument, json FROM {table}'
+                ' WHERE instrument = ? ORDER BY time;',
+                [instrument]
+            )
+        else:
+            cur = con.execute(
+                f'SELECT time, instrument, json FROM {table} ORDER BY time;'
+            )
+        while True:
+            rows = cur.fetchmany(chunksize)
+            if rows:
+                yield from rows
+            else:
+                break
+    finally:
+        con.close()
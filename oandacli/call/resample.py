@@ -0,0 +1,248 @@
+#!/usr/bin/env python
+
+import json
+import logging
+import re
+import sqlite3
+from pathlib import Path
+
+import pandas as pd
+import pandas.io.sql as pdsql
+
+from .candle import write_candles_to_csv_dir, write_candles_to_sqlite
+
+OHLC_AGGREGATIONS = {
+    **{f'open{s}': 'first' for s in ['Bid', 'Ask', 'Mid']},
+    **{f'high{s}': 'max' for s in ['Bid', 'Ask', 'Mid']},
+    **{f'low{s}': 'min' for s in ['Bid', 'Ask', 'Mid']},
+    **{f'close{s}': 'last' for s in ['Bid', 'Ask', 'Mid']},
+    'volume': 'sum'
+}
+
+
+def resample_candles(data_path, granularity, instruments=None,
+                     from_time=None, to_time=None, csv_dir_path=None,
+                     sqlite_path=None, print_json=False, quiet=False,
+                     chunksize=100000):
+    logger = logging.getLogger(__name__)
+    logger.info('Candle resampling')
+    insts = instruments or _list_stored_instruments(data_path=data_path)
+    assert insts, 'instruments required'
+    df_all = pd.concat([
+        _resample_chunks(
+            chunks=_read_candle_chunks(
+                data_path=data_path, instrument=i, granularity=granularity,
+                from_time=from_time, to_time=to_time, chunksize=chunksize
+            ),
+            granularity=granularity
+        ).assign(instrument=i) for i in insts
+    ]).reset_index().set_index(['instrument', 'time'])
+    logger.debug(f'df_all.shape:\t{df_all.shape}')
+    if csv_dir_path:
+        write_candles_to_csv_dir(
+            df=df_all, csv_dir_path=csv_dir_path, granularity=granularity
+        )
+    if sqlite_path:
+        write_candles_to_sqlite(
+            df=df_all, sqlite_path=sqlite_path, table=f'candle_{granularity}'
+        )
+    if not quiet:
+        if print_json:
+            print(
+                json.dumps(
+                    {
+                        i: d.reset_index(level=0, drop=True).reset_index(
+                        ).to_dict(orient='records')
+                        for i, d in df_all.groupby(level=0)
+                    },
+                    indent=2
+                )
+            )
+        else:
+            with pd.option_context('display.max_rows', None):
+                print(df_all)
+    return df_all
+
+
+def _resample_chunks(chunks, granularity):
+    """Aggregate time-ordered candle chunks into buckets of a granularity.
+
+    Buckets at either edge of the data that the source candles do not fully
+    cover (the first candle starts after the bucket start, or the last one
+    ends before the bucket end) are dropped, so that every written bar is a
+    complete one.  The source step is the smallest gap between candles.
+    """
+    logger = logging.getLogger(__name__)
+    results = list()
+    df_carry = None
+    first = None
+    step = None
+    for df_chunk in chunks:
+        df = _assign_buckets(
+            df=(
+                pd.concat([df_carry, df_chunk]) if df_carry is not None
+                else df_chunk
+            ),
+            granularity=granularity
+        )
+        if df.size == 0:
+            continue
+        gaps = df['datetime'].diff().pipe(lambda s: s[s > pd.Timedelta(0)])
+        if gaps.size > 0:
+            step = gaps.min() if step is None else min(step, gaps.min())
+        if first is None:
+            first = df[['datetime', 'bucket']].iloc[0]
+        last_bucket = df['bucket'].iloc[-1]
+        df_carry = df[df['bucket'] == last_bucket].drop(
+            columns=['datetime', 'bucket']
+        )
+        results.append(_aggregate(df[df['bucket'] != last_bucket]))
+    if df_carry is not None and df_carry.size > 0:
+        df_last = _assign_buckets(df=df_carry, granularity=granularity)
+        if step is not None and (
+                _floor_time(
+                    df_last['datetime'].iloc[-1:] + step,
+                    granularity=granularity
+                ).iloc[0] != df_last['bucket'].iloc[-1]):
+            results.append(_aggregate(df_last))
+        else:
+            logger.debug(f'Drop a partial bucket:\t{df_last["time"].iloc[0]}')
+    df_bars = (
+        pd.concat(results) if results
+        else pd.DataFrame(columns=['time']).set_index('time')
+    )
+    if first is not None and first['datetime'] != first['bucket']:
+        first_time = _format_buckets([first['bucket']])[0]
+        logger.debug(f'Drop a partial bucket:\t{first_time}')
+        df_bars = df_bars[df_bars.index != first_time]
+    return df_bars
+
+
+def _assign_buckets(df, granularity):
+    return df.assign(
+        datetime=lambda d: pd.to_datetime(d['time'], utc=True)
+    ).assign(
+        bucket=lambda d: _floor_time(d['datetime'], granularity=granularity)
+    )
+
+
+def _aggregate(df):
+    return df.groupby('bucket', sort=True).agg(
+        {k: v for k, v in OHLC_AGGREGATIONS.items() if k in df.columns}
+    ).pipe(
+        lambda d: d.set_axis(_format_buckets(d.index), axis=0).rename_axis(
+            'time'
+        )
+    )
+
+
+def _format_buckets(buckets):
+    return pd.DatetimeIndex(buckets).strftime('%Y-%m-%dT%H:%M:%S.%f000Z')
+
+
+def _floor_time(dt, granularity, alignment_hour=17,
+                alignment_tz='America/New_York'):
+    m = re.fullmatch(r'([SMH])(\d+)', granularity)
+    if m:
+        return dt.dt.floor(
+            '{0}{1}'.format(
+                m.group(2), {'S': 's', 'M': 'min', 'H': 'h'}[m.group(1)]
+            )
+        )
+    elif granularity in ['D', 'W', 'M']:
+        # align days at 17:00 America/New_York and weeks on Friday like the API
+        shift = pd.Timedelta(hours=(24 - alignment_hour))
+        local = dt.dt.tz_convert(alignment_tz).dt.tz_localize(None) + shift
+        if granularity == 'D':
+            start = local.dt.floor('1D')
+        else:
+            start = local.dt.to_period(
+                'W-FRI' if granularity == 'W' else 'M'
+            ).dt.start_time
+        return (start - shift).dt.tz_localize(alignment_tz).dt.tz_convert(
+            'UTC'
+        )
+    else:
+        raise ValueError(f'invalid granularity:\t{granularity}')
+
+
+def _read_candle_chunks(data_path, instrument, granularity, from_time=None,
+                        to_time=None, chunksize=100000):
+    path = Path(data_path)
+    if path.is_dir():
+        csv_paths = _select_csv_paths(
+            csv_dir=path, instrument=instrument, granularity=granularity
+        )
+        t0 = _to_utc(from_time) if from_time else None
+        t1 = _to_utc(to_time) if to_time else None
+        for p in csv_paths:
+            df = pd.read_csv(p).assign(
+                datetime=lambda d: pd.to_datetime(d['time'], utc=True)
+            )
+            if t0 is not None:
+                df = df[df['datetime'] >= t0]
+            if t1 is not None:
+                df = df[df['datetime'] < t1]
+            yield df.sort_values('datetime').drop(columns='datetime')
+    else:
+        conditions = ['instrument = ?']
+        params = [instrument]
+        if from_time:
+            conditions.append('time >= ?')
+            params.append(_format_time(from_time))
+        if to_time:
+            conditions.append('time < ?')
+            params.append(_format_time(to_time))
+        with sqlite3.connect(str(path)) as con:
+            yield from pdsql.read_sql(
+                'SELECT * FROM candle WHERE {} ORDER BY time;'.format(
+                    ' AND '.join(conditions)
+                ),
+                con=con, params=params, chunksize=int(chunksize)
+            )
+
+
+def _select_csv_paths(csv_dir, instrument, granularity):
+    target_sec = _granularity_seconds(granularity)
+    by_gran = dict()
+    for p in csv_dir.glob(f'candle.*.{instrument}.*.csv'):
+        g = p.name.split('.')[1]
+        sec = _granularity_seconds(g)
+        if sec <= target_sec and target_sec % sec == 0:
+            by_gran.setdefault(sec, list()).append(p)
+    if by_gran:
+        return sorted(by_gran[min(by_gran)])
+    else:
+        return list()
+
+
+def _granularity_seconds(granularity):
+    m = re.fullmatch(r'([SMH])(\d+)', granularity)
+    if m:
+        return int(m.group(2)) * {'S': 1, 'M': 60, 'H': 3600}[m.group(1)]
+    else:
+        return {'D': 86400, 'W': 604800, 'M': 2419200}[granularity]
+
+
+def _to_utc(t):
+    ts = pd.Timestamp(t)
+    return ts.tz_localize('UTC') if ts.tz is None else ts.tz_convert('UTC')
+
+
+def _format_time(t):
+    return _to_utc(t).strftime('%Y-%m-%dT%H:%M:%S.%f000Z')
+
+
+def _list_stored_instruments(data_path):
+    path = Path(data_path)
+    if path.is_dir():
+        return sorted(
+            {p.name.split('.')[2] for p in path.glob('candle.*.csv')}
+        )
+    else:
+        with sqlite3.connect(str(path)) as con:
+            return [
+                r[0] for r in con.execute(
+                    'SELECT DISTINCT instrument FROM candle ORDER BY 1;'
+                )
+            ]
@@ -0,0 +1,134 @@
+#!/usr/bin/env python
+
+import logging
+import time
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from .streamer import StreamDriver
+
+
+class SpreadRingBuffer(object):
+    """Fixed-size ring buffer of spread/mid ratios for one instrument.
+
+    Each push updates one slot and a running sum per window, so the cost per
+    tick does not depend on the window sizes.  Percentiles and maxima are
+    computed from the buffer only when a summary is requested.
+    """
+
+    def __init__(self, windows=(100, 1000, 10000)):
+        self.windows = sorted({int(w) for w in windows})
+        self.__size = self.windows[-1]
+        self.__buffer = np.zeros(self.__size, dtype=np.float64)
+        self.__sums = [0.0] * len(self.windows)
+        self.__count = 0
+
+    def push(self, value):
+        i = self.__count % self.__size
+        for j, w in enumerate(self.windows):
+            self.__sums[j] += value - (
+                self.__buffer[(i - w) % self.__size] if self.__count >= w
+                else 0.0
+            )
+        self.__buffer[i] = value
+        self.__count += 1
+
+    def summarize(self, quantiles=(50, 90, 99)):
+        stats = list()
+        for w, s in zip(self.windows, self.__sums):
+            n = min(self.__count, w)
+            if n == 0:
+                continue
+            idx = np.arange(self.__count - n, self.__count) % self.__size
+            v = self.__buffer[idx]
+            stats.append({
+                'window': w, 'count': n, 'mean': s / n,
+                **{
+                    f'p{q}': p for q, p
+                    in zip(quantiles, np.percentile(v, quantiles))
+                },
+                'max': v.max()
+            })
+        return stats
+
+
+class SpreadMonitor(StreamDriver):
+    def __init__(self, api, account_id, instruments, windows=(100, 1000),
+                 interval=5, csv_path=None, quiet=False, timeout_sec=0,
+                 ignore_api_error=False):
+        super().__init__(
+            api=api, account_id=account_id, target='pricing',
+            instruments=instruments, timeout_sec=timeout_sec, snapshot=True,
+            ignore_api_error=ignore_api_error, raw=True
+        )
+        self.__logger = logging.getLogger(__name__)
+        self.__windows = windows
+        self.__buffers = dict()
+        self.__interval = float(interval)
+        self.__csv_path = str(Path(csv_path).resolve()) if csv_path else None
+        self.__quiet = quiet
+        self.__last_summary_time = time.monotonic()
+
+    def act(self, msg_type, msg):
+        if msg_type.endswith('Heartbeat') or not msg.instrument:
+            pass
+        else:
+            price = msg.data
+            bid = float(price['closeoutBid'])
+            ask = float(price['closeoutAsk'])
+            buf = self.__buffers.get(msg.instrument)
+            if buf is None:
+                buf = self.__buffers[msg.instrument] = SpreadRingBuffer(
+                    windows=self.__windows
+                )
+            buf.push((ask - bid) * 2 / (ask + bid))
+        if time.monotonic() - self.__last_summary_time >= self.__interval:
+            self.emit_summary()
+
+    def emit_summary(self):
+        self.__last_summary_time = time.monotonic()
+        df_stat = self.summarize()
+        if df_stat.size == 0:
+            return
+        if self.__csv_path:
+            df_stat.assign(
+                time=pd.Timestamp.now(tz='UTC').isoformat()
+            ).reset_index().set_index(['time', 'instrument', 'window']).to_csv(
+                self.__csv_path, mode='a',
+                header=(not Path(self.__csv_path).is_file())
+            )
+        if not self.__quiet:
+            with pd.option_context('display.max_rows', None):
+                print(df_stat, flush=True)
+
+    def summarize(self):
+        return pd.DataFrame([
+            {'instrument': i, **s}
+            for i, b in sorted(self.__buffers.items()) for s in b.summarize()
+        ]).pipe(
+            lambda d: (d.set_index(['instrument', 'window']) if d.size else d)
+        )
+
+    def shutdown(self):
+        self.emit_summary()
+
+
+def monitor_spreads(api, account_id, instruments, windows='100,1000,10000',
+                    interval=5, csv_path=None, quiet=False):
+    assert account_id, 'account ID required'
+    assert instruments, 'instruments required'
+    logger = logging.getLogger(__name__)
+    logger.info('Spread monitoring')
+    monitor = SpreadMonitor(
+        api=api, account_id=account_id, instruments=instruments,
+        windows=[
+            int(w) for w in (
+                windows.split(',') if isinstance(windows, str) else windows
+            )
+        ],
+        interval=interval, csv_path=csv_path, quiet=quiet
+    )
+    monitor.invoke()
+    monitor.emit_summary()
@@ -1,22 +1,107 @@
 #!/usr/bin/env python
 
+import csv
+import json
 import logging
+import multiprocessing as mp
+import queue
 import signal
 import sqlite3
+import threading
+import time
+import zlib
 from abc import ABCMeta, abstractmethod
 from datetime import datetime
 from pathlib import Path
 
-import pandas as pd
 import redis
 from v20 import V20ConnectionError, V20Timeout
 
-from ..util.logger import log_response
+from ..util.logger import SampledLogger, log_response
+from ..util.metrics import get_metrics, rfc3339_to_epoch
+
+try:
+    from orjson import loads as json_loads
+except ImportError:
+    json_loads = json.loads
+
+
+class RawStreamMessage(object):
+    __slots__ = (
+        'raw', 'data', 'type', 'instrument', 'time', '_target', '_api'
+    )
+
+    def __init__(self, raw, data, target='pricing', api=None):
+        self.raw = raw
+        self.data = data
+        self.type = data.get('type')
+        self.instrument = data.get('instrument')
+        self.time = data.get('time')
+        self._target = target
+        self._api = api
+
+    def json(self):
+        return self.raw.decode('utf-8')
+
+    def model(self):
+        return parse_stream_msg(
+            api=self._api, target=self._target, data=self.data
+        )[1]
+
+    def __str__(self):
+        return self.json()
+
+
+class RawLineParser(object):
+    def __init__(self, api=None, target='pricing'):
+        self.__api = api
+        self.__target = target
+
+    def __call__(self, line):
+        data = json_loads(line)
+        msg = RawStreamMessage(
+            raw=line, data=data, target=self.__target, api=self.__api
+        )
+        if msg.type == 'HEARTBEAT':
+            return (
+                'pricing.PricingHeartbeat' if self.__target == 'pricing'
+                else 'transaction.TransactionHeartbeat'
+            ), msg
+        else:
+            return (
+                'pricing.ClientPrice' if self.__target == 'pricing'
+                else 'transaction.Transaction'
+            ), msg
+
+
+def parse_stream_msg(api, target, data):
+    if target == 'pricing':
+        if data.get('type') == 'HEARTBEAT':
+            return (
+                'pricing.PricingHeartbeat',
+                api.pricing.PricingHeartbeat.from_dict(data, api)
+            )
+        else:
+            return (
+                'pricing.ClientPrice',
+                api.pricing.ClientPrice.from_dict(data, api)
+            )
+    elif data.get('type') == 'HEARTBEAT':
+        return (
+            'transaction.TransactionHeartbeat',
+            api.transaction.TransactionHeartbeat.from_dict(data, api)
+        )
+    else:
+        return (
+            'transaction.Transaction',
+            api.transaction.Transaction.from_dict(data, api)
+        )
 
 
 class StreamDriver(object, metaclass=ABCMeta):
     def __init__(self, api, account_id, target='pricing', instruments=None,
-                 timeout_sec=0, snapshot=True, ignore_api_error=False):
+                 timeout_sec=0, snapshot=True, ignore_api_error=False,
+                 raw=False):
         if target not in ['pricing', 'transaction']:
             raise ValueError(f'invalid target:\t{target}')
         elif target == 'pricing' and not instruments:
@@ -30,16 +115,45 @@ class StreamDriver(object, metaclass=ABCMeta):
             self.__timeout_sec = float(timeout_sec) if timeout_sec else None
             self.__snapshot = snapshot
             self.__ignore_api_error = ignore_api_error
+            self.__raw = raw
             self.__latest_update_time = None
+            self.__metrics = get_metrics()
+            self.__stop_event = threading.Event()
+
+    def stop(self):
+        self.__stop_event.set()
 
     def invoke(self):
-        signal.signal(signal.SIGINT, signal.SIG_DFL)
+        if threading.current_thread() is threading.main_thread():
+            signal.signal(signal.SIGINT, signal.SIG_DFL)
+        m = self.__metrics
         try:
             res = self._call_stream_api()
+            if self.__raw:
+                res.line_parser = RawLineParser(
+                    api=self.__api, target=self.__target
+                )
+            if m:
+                res.line_parser = m.timed(
+                    res.line_parser, 'oandacli_stream_parse_seconds',
+                    target=self.__target
+                )
             for msg_type, msg in res.parts():
+                if self.__stop_event.is_set():
+                    break
+                if m:
+                    m.inc('oandacli_stream_messages_total', type=msg_type)
+                    if getattr(msg, 'time', None):
+                        m.observe(
+                            'oandacli_stream_latency_seconds',
+                            time.time() - rfc3339_to_epoch(msg.time),
+                            target=self.__target
+                        )
                 self.act(msg_type, msg)
                 self.__latest_update_time = datetime.now()
         except (V20ConnectionError, V20Timeout) as e:
+            if m:
+                m.inc('oandacli_stream_errors_total', error=type(e).__name__)
             if not self.__ignore_api_error:
                 self.shutdown()
                 raise e
@@ -81,16 +195,22 @@ class StreamRecorder(StreamDriver):
                  timeout_sec=0, snapshot=True, ignore_api_error=False,
                  skip_heartbeats=True, use_redis=False, redis_host='127.0.0.1',
                  redis_port=6379, redis_db=0, redis_max_llen=None,
-                 sqlite_path=None, csv_path=None, quiet=False):
+                 sqlite_path=None, csv_path=None, quiet=False,
+                 debug_sample_every=100, raw=False, flush_redis=True,
+                 sqlite_commit_interval=0):
         super().__init__(
             api=api, account_id=account_id, target=target,
             instruments=instruments, timeout_sec=timeout_sec,
-            snapshot=snapshot, ignore_api_error=ignore_api_error
+            snapshot=snapshot, ignore_api_error=ignore_api_error, raw=raw
         )
         self.__logger = logging.getLogger(__name__)
         self.__instruments = instruments
         self.__skip_heartbeats = skip_heartbeats
         self.__quiet = quiet
+        self.__metrics = get_metrics()
+        self.__sampled_logger = SampledLogger(
+            logger=self.__logger, every=debug_sample_every
+        )
         if use_redis:
             self.__logger.info('Set a streamer with Redis')
             self.__redis_pool = redis.ConnectionPool(
@@ -99,8 +219,11 @@ class StreamRecorder(StreamDriver):
             self.__redis_max_llen = (
                 int(redis_max_llen) if redis_max_llen else None
             )
-            redis_c = redis.StrictRedis(connection_pool=self.__redis_pool)
-            redis_c.flushdb()
+            if flush_redis:
+                redis_c = redis.StrictRedis(
+                    connection_pool=self.__redis_pool
+                )
+                redis_c.flushdb()
         else:
             self.__redis_pool = None
             self.__redis_max_llen = None
@@ -108,36 +231,65 @@ class StreamRecorder(StreamDriver):
             self.__logger.info('Set a streamer with SQLite')
             sqlite_file = Path(sqlite_path).resolve()
             if sqlite_file.is_file():
-                self.__sqlite = sqlite3.connect(str(sqlite_file))
+                self.__sqlite = sqlite3.connect(str(sqlite_file), timeout=60)
             else:
                 schema_sql = Path(__file__).parent.parent.joinpath(
                     'static/create_tables.sql'
                 )
-                self.__sqlite = sqlite3.connect(str(sqlite_file))
+                self.__sqlite = sqlite3.connect(str(sqlite_file), timeout=60)
                 with open(schema_sql, 'r') as f:
                     self.__sqlite.executescript(f.read())
         else:
             self.__sqlite = None
+        self.__sqlite_commit_interval = float(sqlite_commit_interval or 0)
+        self.__sqlite_commit_time = time.monotonic()
         if csv_path:
-            self.__csv_path = str(Path(csv_path).resolve())
+            self.__logger.info('Set a streamer with CSV')
+            csv_file = Path(csv_path).resolve()
+            write_header = (
+                not csv_file.is_file() or csv_file.stat().st_size == 0
+            )
+            self.__csv = open(csv_file, 'a', newline='')
+            self.__csv_writer = csv.writer(
+                self.__csv, lineterminator='\n',
+                delimiter=(',' if csv_file.suffix == '.csv' else '\t')
+            )
+            if write_header:
+                self.__csv_writer.writerow(['time', 'instrument', 'json'])
+                self.__csv.flush()
         else:
-            self.__csv_path = None
+            self.__csv = None
 
     def act(self, msg_type, msg):
         if msg_type.endswith('Heartbeat') and self.__skip_heartbeats:
             self.__logger.debug(msg)
         elif (msg_type.startswith('transaction.') or
               (msg_type.startswith('pricing.') and msg.instrument)):
-            self.__logger.debug(msg)
+            self.__sampled_logger.log(msg)
             self._print_and_write_msg(msg_type=msg_type, msg=msg)
         else:
-            self.__logger.warning(f'Save skipped:\t{msg}')
+            self.__logger.warning('Save skipped:\t%s', msg)
 
     def _print_and_write_msg(self, msg_type, msg):
+        m = self.__metrics
+        t = m and time.perf_counter()
         msg_json_str = str(msg.json())
+        if m:
+            m.lap('oandacli_record_seconds', t, stage='serialize')
+        self.record(
+            msg_type=msg_type, msg_time=msg.time,
+            instrument=(msg.instrument if hasattr(msg, 'instrument') else ''),
+            msg_json_str=msg_json_str
+        )
+
+    def record(self, msg_type, msg_time, instrument, msg_json_str):
+        m = self.__metrics
+        t = m and time.perf_counter()
         if not self.__quiet:
             print(msg_json_str, flush=True)
-        inst = (msg.instrument if hasattr(msg, 'instrument') else '')
+            if m:
+                t = m.lap('oandacli_record_seconds', t, stage='stdout')
+        inst = instrument or ''
         if self.__redis_pool:
             data_key = inst or 'transactions'
             redis_c = redis.StrictRedis(connection_pool=self.__redis_pool)
@@ -145,51 +297,235 @@ class StreamRecorder(StreamDriver):
             if self.__redis_max_llen:
                 if redis_c.llen(data_key) > self.__redis_max_llen:
                     redis_c.lpop(data_key)
+            if m:
+                t = m.lap('oandacli_record_seconds', t, stage='redis')
         if self.__sqlite:
             c = self.__sqlite.cursor()
             table_name = msg_type.split('.')[0] + '_stream'
             c.execute(
                 f'INSERT INTO {table_name} VALUES (?,?,?)',
-                [msg.time, inst, msg_json_str]
-            )
-            self.__sqlite.commit()
-        if self.__csv_path:
-            pd.DataFrame(
-                [{'time': msg.time, 'instrument': inst, 'json': msg_json_str}]
-            ).set_index(
-                ['time', 'instrument']
-            ).to_csv(
-                self.__csv_path, mode='a',
-                sep=(',' if self.__csv_path.endswith('.csv') else '\t'),
-                header=(not Path(self.__csv_path).is_file())
+                [msg_time, inst, msg_json_str]
             )
+            now = time.monotonic()
+            if (now - self.__sqlite_commit_time
+                    >= self.__sqlite_commit_interval):
+                self.__sqlite.commit()
+                self.__sqlite_commit_time = now
+            if m:
+                t = m.lap('oandacli_record_seconds', t, stage='sqlite')
+        if self.__csv:
+            self.__csv_writer.writerow([msg_time, inst, msg_json_str])
+            self.__csv.flush()
+            if m:
+                m.lap('oandacli_record_seconds', t, stage='csv')
 
     def shutdown(self):
         if self.__redis_pool:
             self.__redis_pool.disconnect()
         if self.__sqlite:
+            self.__sqlite.commit()
             self.__sqlite.close()
+            self.__sqlite = None
+        if self.__csv:
+            self.__csv.close()
+            self.__csv = None
+
+
+class ShardStreamer(StreamRecorder):
+    """Stream recorder run in a worker process for a subset of instruments.
+
+    Each shard writes to the sinks itself with its own connections, and
+    commits SQLite rows every sqlite_commit_interval seconds so that shards
+    do not queue on the database lock for every tick.  The parent only
+    receives the time of the latest message in last_update and,
+    when metrics are enabled, batches of (type, latency) sent to stats_queue.
+    """
+
+    def __init__(self, api, account_id, instruments, last_update,
+                 stats_queue=None, stats_interval=0.5,
+                 sqlite_commit_interval=0.5, **kwargs):
+        super().__init__(
+            api=api, account_id=account_id, target='pricing',
+            instruments=instruments,
+            sqlite_commit_interval=sqlite_commit_interval, **kwargs
+        )
+        self.__last_update = last_update
+        self.__stats_queue = stats_queue
+        self.__stats_interval = float(stats_interval)
+        self.__stats = list()
+        self.__stats_time = time.monotonic()
+
+    def act(self, msg_type, msg):
+        self.__last_update.value = time.time()
+        if self.__stats_queue is not None:
+            if msg.time:
+                self.__stats.append(
+                    (msg_type, time.time() - rfc3339_to_epoch(msg.time))
+                )
+            if time.monotonic() - self.__stats_time >= self.__stats_interval:
+                self._send_stats()
+        super().act(msg_type, msg)
+
+    def _send_stats(self):
+        if self.__stats:
+            self.__stats_queue.put(self.__stats)
+            self.__stats = list()
+        self.__stats_time = time.monotonic()
+
+    def shutdown(self):
+        if self.__stats_queue is not None:
+            self._send_stats()
+        super().shutdown()
+
+
+def assign_shards(instruments, n_shards):
+    shards = [list() for _ in range(n_shards)]
+    for i in instruments:
+        shards[zlib.crc32(i.encode()) % n_shards].append(i)
+    return [s for s in shards if s]
+
+
+def _run_shard(api, account_id, instruments, last_update, stats_queue=None,
+               **kwargs):
+    streamer = ShardStreamer(
+        api=api, account_id=account_id, instruments=instruments,
+        last_update=last_update, stats_queue=stats_queue, snapshot=True,
+        ignore_api_error=False, **kwargs
+    )
+    try:
+        streamer.invoke()
+    finally:
+        streamer.shutdown()
+
+
+def _invoke_sharded_streamer(api, account_id, instruments, n_shards,
+                             timeout_sec=0, ignore_api_error=False,
+                             recorder_kwargs=None, max_restart_delay=60):
+    logger = logging.getLogger(__name__)
+    m = get_metrics()
+    shards = assign_shards(instruments=instruments, n_shards=n_shards)
+    logger.info(f'Shards:\t{len(shards)} for {len(instruments)} instruments')
+    mp_ctx = mp.get_context()
+    stats_queue = mp_ctx.Queue() if m else None
+    last_updates = [mp_ctx.Value('d', 0.0, lock=False) for _ in shards]
+    procs = [None] * len(shards)
+    finished = [False] * len(shards)
+    started = [0.0] * len(shards)
+    restart_delay = [1] * len(shards)
+    restart_at = [time.monotonic()] * len(shards)
+    try:
+        while not all(finished):
+            now = time.monotonic()
+            for i, insts in enumerate(shards):
+                if finished[i] or (procs[i] and procs[i].is_alive()):
+                    continue
+                elif procs[i] and procs[i].exitcode == 0:
+                    logger.info(f'Shard {i} finished:\t{insts}')
+                    finished[i] = True
+                elif procs[i]:
+                    msg = f'Shard {i} exited ({procs[i].exitcode}):\t{insts}'
+                    if m:
+                        m.inc(
+                            'oandacli_stream_errors_total', error='ShardExit'
+                        )
+                    if not ignore_api_error:
+                        raise RuntimeError(msg)
+                    logger.error(msg)
+                    idle_sec = time.time() - last_updates[i].value
+                    if (timeout_sec and last_updates[i].value
+                            and idle_sec > float(timeout_sec)):
+                        logger.warning(f'Timeout:\t{timeout_sec} sec')
+                        raise RuntimeError(f'shard {i} timed out')
+                    restart_delay[i] = (
+                        1 if now - started[i] > max_restart_delay
+                        else min(restart_delay[i] * 2, max_restart_delay)
+                    )
+                    restart_at[i] = now + restart_delay[i]
+                    procs[i] = None
+                    if m:
+                        m.inc('oandacli_stream_reconnects_total', shard=i)
+                elif now >= restart_at[i]:
+                    logger.info(f'Start shard {i}:\t{insts}')
+                    procs[i] = mp_ctx.Process(
+                        target=_run_shard, daemon=True,
+                        kwargs={
+                            'api': api, 'account_id': account_id,
+                            'instruments': insts,
+                            'last_update': last_updates[i],
+                            'stats_queue': stats_queue,
+                            **(recorder_kwargs or dict())
+                        }
+                    )
+                    procs[i].start()
+                    started[i] = now
+            if stats_queue is None:
+                time.sleep(0.5)
+            else:
+                _drain_stats(metrics=m, stats_queue=stats_queue, timeout=0.5)
+        if stats_queue is not None:
+            _drain_stats(metrics=m, stats_queue=stats_queue, timeout=0)
+    finally:
+        for p in procs:
+            if p and p.is_alive():
+                p.terminate()
+
+
+def _drain_stats(metrics, stats_queue, timeout=0.5):
+    deadline = time.monotonic() + timeout
+    while True:
+        try:
+            stats = stats_queue.get(
+                timeout=max(deadline - time.monotonic(), 0.01)
+            )
+        except queue.Empty:
+            break
+        else:
+            for msg_type, latency in stats:
+                metrics.inc('oandacli_stream_messages_total', type=msg_type)
+                metrics.observe(
+                    'oandacli_stream_latency_seconds', latency,
+                    target='pricing'
+                )
+        if time.monotonic() >= deadline:
+            break
 
 
 def invoke_streamer(api, account_id, instruments, target='pricing',
                     timeout_sec=0, csv_path=None, sqlite_path=None,
                     use_redis=False, redis_host='127.0.0.1', redis_port=6379,
                     redis_db=0, redis_max_llen=None, ignore_api_error=False,
-                    quiet=False, skip_heartbeats=True):
+                    quiet=False, skip_heartbeats=True, shards=1, raw=False):
     assert account_id, 'account ID required'
     assert instruments, 'instruments required'
     logger = logging.getLogger(__name__)
     logger.info('Streaming')
+    n_shards = int(shards or 1)
+    if n_shards > 1 and target != 'pricing':
+        raise ValueError(f'{target}:\tsharding requires the pricing target')
     if use_redis:
         assert redis_host, 'redis_host required'
         assert redis_port, 'redis_port required'
         assert redis_db or redis_db == 0, 'redis_db required'
+    recorder_kwargs = {
+        'skip_heartbeats': skip_heartbeats, 'use_redis': use_redis,
+        'redis_host': redis_host, 'redis_port': redis_port,
+        'redis_db': redis_db, 'redis_max_llen': redis_max_llen,
+        'sqlite_path': sqlite_path, 'csv_path': csv_path, 'quiet': quiet,
+        'raw': raw
+    }
     streamer = StreamRecorder(
         api=api, account_id=account_id, target=target, instruments=instruments,
         timeout_sec=timeout_sec, snapshot=True,
-        ignore_api_error=ignore_api_error, skip_heartbeats=skip_heartbeats,
-        use_redis=use_redis, redis_host=redis_host, redis_port=redis_port,
-        redis_db=redis_db, redis_max_llen=redis_max_llen,
-        sqlite_path=sqlite_path, csv_path=csv_path, quiet=quiet
+        ignore_api_error=ignore_api_error, **recorder_kwargs
     )
-    streamer.invoke()
+    if n_shards > 1:
+        # the parent prepares the sinks once; shards open their own handles
+        streamer.shutdown()
+        _invoke_sharded_streamer(
+            api=api, account_id=account_id, instruments=instruments,
+            n_shards=n_shards, timeout_sec=timeout_sec,
+            ignore_api_error=ignore_api_error,
+            recorder_kwargs={**recorder_kwargs, 'flush_redis': False}
+        )
+    else:
+        streamer.invoke()
@@ -11,32 +11,46 @@ import pandas as pd
 import pandas.io.sql as pdsql
 import yaml
 
+from ..util.fanout import map_accounts
 from ..util.logger import log_response
+from ..util.metrics import get_metrics
 from .plot import plot_pl
 
 
 def track_transaction(api, account_id, from_time=None, to_time=None,
                       csv_path=None, sqlite_path=None, pl_graph_path=None,
-                      print_json=False, quiet=False):
-    assert account_id, 'account ID required'
+                      print_json=False, quiet=False, account_ids=None,
+                      max_workers=8):
+    ids = account_ids or [account_id]
+    assert all(ids), 'account ID required'
     logger = logging.getLogger(__name__)
     logger.info('Transaction tracking')
-    transactions = _fetch_transactions(
-        api=api, account_id=account_id, from_time=from_time, to_time=to_time
+    txns_by_account = map_accounts(
+        func=lambda a: _fetch_transactions(
+            api=api, account_id=a, from_time=from_time, to_time=to_time,
+            page_interval=(0 if len(ids) > 1 else 0.5)
+        ),
+        account_ids=ids, max_workers=max_workers
     )
-    if transactions:
+    if any(txns_by_account.values()):
         df_txn = pd.DataFrame([
-            {'id': int(t['id']), 'time': t['time'], 'json': json.dumps(t)}
-            for t in transactions
-        ]).set_index('id')
-        logger.debug(f'df_txn:{os.linesep}{df_txn}')
+            {
+                'account_id': a, 'id': int(t['id']), 'time': t['time'],
+                'json': json.dumps(t)
+            } for a, txns in txns_by_account.items() for t in txns
+        ]).set_index(['account_id', 'id'])
+        logger.debug('df_txn:%s%s', os.linesep, df_txn)
         if csv_path:
             if Path(csv_path).is_file():
-                old_ids = set(
-                    pd.read_csv(csv_path, usecols=['id'], dtype=int)['id']
+                _add_account_id_to_csv(csv_path=csv_path)
+                old_keys = set(
+                    pd.read_csv(
+                        csv_path, usecols=['account_id', 'id'],
+                        dtype={'account_id': str, 'id': int}
+                    ).itertuples(index=False, name=None)
                 )
                 df_txn.pipe(
-                    lambda d: d[~d.index.isin(old_ids)]
+                    lambda d: d[~d.index.isin(old_keys)]
                 ).to_csv(csv_path, mode='a', header=False)
             else:
                 df_txn.to_csv(csv_path)
@@ -44,13 +58,16 @@ def track_transaction(api, account_id, from_time=None, to_time=None,
             tbl = 'transaction_history'
             if Path(sqlite_path).is_file():
                 with sqlite3.connect(sqlite_path) as con:
-                    old_ids = set(
-                        pdsql.read_sql(f'SELECT id FROM {tbl};', con=con)['id']
+                    _add_account_id_to_sqlite(con=con, table=tbl)
+                    old_keys = set(
+                        con.execute(f'SELECT account_id, id FROM {tbl};')
                     )
                     df_txn_new = df_txn.pipe(
-                        lambda d: d[~d.index.isin(old_ids)]
+                        lambda d: d[~d.index.isin(old_keys)]
+                    )
+                    logger.debug(
+                        'df_txn_new:%s%s', os.linesep, df_txn_new
                     )
-                    logger.debug(f'df_txn_new:{os.linesep}{df_txn_new}')
                     if df_txn_new.size > 0:
                         pdsql.to_sql(
                             df_txn_new, name=tbl, con=con, if_exists='append'
@@ -66,14 +83,47 @@ def track_transaction(api, account_id, from_time=None, to_time=None,
         if pl_graph_path:
             plot_pl(df_txn=df_txn, path=pl_graph_path)
     if not quiet:
+        transactions = (
+            txns_by_account if len(ids) > 1 else txns_by_account[ids[0]]
+        )
         print(
             json.dumps(transactions, indent=2) if print_json
             else yaml.dump(transactions, default_flow_style=False).strip()
         )
 
 
-def _fetch_transactions(api, account_id, from_time=None, to_time=None):
+def _add_account_id_to_csv(csv_path):
+    if 'account_id' not in pd.read_csv(csv_path, nrows=0).columns:
+        logging.getLogger(__name__).info(f'Add account IDs:\t{csv_path}')
+        path = Path(csv_path)
+        tmp = path.with_name(f'.{path.name}.{os.getpid()}')
+        try:
+            pd.read_csv(path, dtype={'id': int, 'json': str}).assign(
+                account_id=lambda d: d['json'].map(
+                    lambda s: json.loads(s).get('accountID')
+                )
+            ).set_index(['account_id', 'id']).to_csv(tmp)
+            os.replace(tmp, path)
+        finally:
+            if tmp.exists():
+                tmp.unlink()
+
+
+def _add_account_id_to_sqlite(con, table):
+    if 'account_id' not in [
+            r[1] for r in con.execute(f'PRAGMA table_info({table});')]:
+        logging.getLogger(__name__).info(f'Add account IDs:\t{table}')
+        con.execute(f'ALTER TABLE {table} ADD COLUMN account_id VARCHAR(20);')
+        con.execute(
+            f'UPDATE {table}'
+            ' SET account_id = json_extract(json, \'$.accountID\');'
+        )
+
+
+def _fetch_transactions(api, account_id, from_time=None, to_time=None,
+                        page_interval=0.5):
     logger = logging.getLogger(__name__)
+    m = get_metrics()
     res = api.transaction.list(
         accountID=account_id,
         **{
@@ -84,14 +134,16 @@ def _fetch_transactions(api, account_id, from_time=None, to_time=None):
     log_response(res, logger=logger)
     transactions = list()
     for page in (res.body.get('pages') or list()):
-        time.sleep(0.5)
+        if page_interval:
+            time.sleep(page_interval)
         r = api.transaction.range(
             accountID=account_id, **_parse_idrange(page=page)
         )
         log_response(r, logger=logger)
-        transactions.extend(
-            json.loads(r.raw_body).get('transactions') or list()
-        )
+        txns = json.loads(r.raw_body).get('transactions') or list()
+        if m:
+            m.inc('oandacli_transactions_fetched_total', value=len(txns))
+        transactions.extend(txns)
     return transactions
 
 
@@ -6,23 +6,50 @@ Usage:
     oanda-cli -h|--help
     oanda-cli --version
     oanda-cli init [--debug|--info] [--file=<yaml>]
-    oanda-cli info [--debug|--info] [--file=<yaml>] [--json] <info_target>
+    oanda-cli info [--debug|--info] [--file=<yaml>] [--json] [--refresh]
+                   [--accounts=<ids>] [--workers=<int>] <info_target>
                    [<instrument>...]
     oanda-cli track [--debug|--info] [--file=<yaml>] [--csv-dir=<path>]
                     [--sqlite=<path>] [--granularity=<code>] [--count=<int>]
-                    [--json] [--quiet] [<instrument>...]
+                    [--json] [--metrics-host=<ip>] [--metrics-port=<int>]
+                    [--metrics-interval=<sec>] [--quiet] [<instrument>...]
     oanda-cli stream [--debug|--info] [--file=<yaml>] [--target=<str>]
                      [--timeout=<sec>] [--csv=<path>] [--sqlite=<path>]
                      [--use-redis] [--redis-host=<ip>] [--redis-port=<int>]
                      [--redis-db=<int>] [--redis-max-llen=<int>]
-                     [--ignore-api-error] [--quiet] [<instrument>...]
+                     [--ignore-api-error] [--shards=<int>] [--raw]
+                     [--metrics-host=<ip>] [--metrics-port=<int>]
+                     [--metrics-interval=<sec>] [--quiet] [<instrument>...]
     oanda-cli transaction [--debug|--info] [--file=<yaml>] [--from=<date>]
                           [--to=<date>] [--csv=<path>] [--sqlite=<path>]
-                          [--pl-graph=<path>] [--json] [--quiet]
+                          [--pl-graph=<path>] [--json] [--metrics-host=<ip>]
+                          [--metrics-port=<int>] [--metrics-interval=<sec>]
+                          [--accounts=<ids>] [--workers=<int>] [--quiet]
+    oanda-cli replay [--debug|--info] [--file=<yaml>] [--target=<str>]
+                     [--speed=<float>] [--csv=<path>] [--sqlite=<path>]
+                     [--use-redis] [--redis-host=<ip>] [--redis-port=<int>]
+                     [--redis-db=<int>] [--redis-max-llen=<int>] [--quiet]
+                     <data_path> [<instrument>...]
+    oanda-cli resample [--debug|--info] --granularity=<code> [--from=<date>]
+                       [--to=<date>] [--csv-dir=<path>] [--sqlite=<path>]
+                       [--json] [--quiet] <data_path> [<instrument>...]
+    oanda-cli compact [--debug|--info] [--retention=<days>] [--rollup=<code>]
+                      [--batch-size=<int>] [--full-vacuum] [--quiet]
+                      <data_path>
     oanda-cli plotpl [--debug|--info] <data_path> <graph_path>
     oanda-cli spread [--debug|--info] [--file=<yaml>] [--csv=<path>] [--quiet]
+                     [--refresh] [--stream] [--windows=<str>]
+                     [--interval=<sec>] [--accounts=<ids>] [--workers=<int>]
                      [<instrument>...]
     oanda-cli close [--debug|--info] [--file=<yaml>] [<instrument>...]
+    oanda-cli watch [--debug|--info] [--file=<yaml>] [--interval=<sec>]
+                    [<instrument>...]
+    oanda-cli cache [--debug|--info] [--file=<yaml>] [--clear]
+    oanda-cli mock [--debug|--info] [--port=<int>] [--tick-rate=<float>]
+                   [--ticks=<int>] [--transactions=<int>]
+    oanda-cli bench [--debug|--info] [--ticks=<int>] [--transactions=<int>]
+                    [--max-instruments=<int>] [--use-redis] [--redis-host=<ip>]
+                    [--redis-port=<int>] [--redis-db=<int>] [--json]
 
 Options:
     -h, --help          Print help and exit
@@ -33,9 +60,15 @@ Options:
     --csv-dir=<path>    Write data with daily CSV in a directory
     --sqlite=<path>     Save data in an SQLite3 database
     --granularity=<code>
-                        Set a granularity for rate tracking [default: S5]
+                        Set a granularity for rate tracking or resampling
+                        [default: S5]
     --count=<int>       Set a size for rate tracking (max: 5000) [default: 60]
     --json              Print data with JSON
+    --refresh           Refresh cached instrument and account metadata
+    --accounts=<ids>    Set comma-separated account IDs or "all"
+                        (override YAML configurations)
+    --workers=<int>     Set a number of accounts requested concurrently
+                        [default: 8]
     --target=<str>      Set a streaming target [default: pricing]
                         { pricing, transaction }
     --timeout=<sec>     Set senconds for response timeout
@@ -47,9 +80,39 @@ Options:
     --redis-max-llen=<int>
                         Limit Redis list length (override YAML configurations)
     --ignore-api-error  Ignore Oanda API connection errors
+    --shards=<int>      Split instruments across parallel stream processes
+                        [default: 1]
+    --raw               Write streamed JSON as received (skip v20 models;
+                        prices stay strings instead of numbers)
+    --metrics-host=<ip> Set an address to expose metrics on
+                        [default: 127.0.0.1]
+    --metrics-port=<int>
+                        Expose Prometheus metrics on a port
+    --metrics-interval=<sec>
+                        Print metrics as JSON lines to stderr periodically
+    --speed=<float>     Set a replay speed multiplier (0: no wait)
+                        [default: 0]
     --from=<date>       Specify the starting time
     --to=<date>         Specify the ending time
+    --retention=<days>  Keep raw ticks for a number of days [default: 7]
+    --rollup=<code>     Set a tick rollup granularity { S1, M1 }
+                        [default: M1]
+    --batch-size=<int>  Set rows deleted per transaction [default: 10000]
+    --full-vacuum       Rebuild a database once to enable incremental vacuum
     --pl-graph=<path>   Visualize PL in a graphics file such as PDF or PNG
+    --stream            Monitor spreads continuously with a price stream
+    --windows=<str>     Set rolling window sizes in ticks
+                        [default: 100,1000,10000]
+    --interval=<sec>    Set seconds between reports [default: 5]
+    --clear             Remove all cached metadata
+    --port=<int>        Set a port for the mock server [default: 8080]
+    --tick-rate=<float> Set mock ticks per second (0: no wait) [default: 0]
+    --ticks=<int>       Set mock ticks per stream connection [default: 20000]
+    --transactions=<int>
+                        Set a number of mock transactions [default: 5000]
+    --max-instruments=<int>
+                        Set a maximum number of benchmark instruments
+                        [default: 64]
 
 Commands:
     init                Create a YAML template for configuration
@@ -57,9 +120,17 @@ Commands:
     track               Fetch past rates
     stream              Stream market prices or authorized account events
     transaction         Fetch the latest transactions
+    replay              Replay recorded market prices or account events
+    resample            Aggregate stored candles into a coarser granularity
+                        (written into candle_<code> in SQLite)
+    compact             Roll up old ticks and compact an SQLite database
     plotpl              Visualize cumulative PL in a file
     spread              Print the ratios of spread to price
     close               Close positions (if not <instrument>, close all)
+    watch               Track account state with transaction and price streams
+    cache               Print or clear cached metadata
+    mock                Run a local mock server of Oanda V20 API
+    bench               Benchmark commands against a local mock server
 
 Arguments:
     <info_target>       { instruments, prices, account, accounts, orders,
@@ -78,6 +149,8 @@ Arguments:
                           USD_JPY, USD_MXN, USD_NOK, USD_PLN, USD_SAR, USD_SEK,
                           USD_SGD, USD_THB, USD_TRY, USD_ZAR, ZAR_JPY }
     <data_path>         Path to an input CSV or SQLite file
+                        (or a Redis URL such as redis://127.0.0.1:6379/0,
+                        or a daily CSV directory written by track)
     <graph_path>        Path to an output graphics file such as PDF or PNG
 """
 
@@ -89,14 +162,24 @@ import v20
 from docopt import docopt
 
 from .. import __version__
+from ..call.account import watch_account
+from ..call.benchmark import run_benchmark
 from ..call.candle import track_rate
+from ..call.compact import compact_sqlite
 from ..call.info import print_info, print_spread_ratios
 from ..call.order import close_positions
 from ..call.plot import read_and_plot_pl
+from ..call.replay import replay_stream
+from ..call.resample import resample_candles
+from ..call.spread import monitor_spreads
 from ..call.streamer import invoke_streamer
 from ..call.transaction import track_transaction
+from ..util.cache import create_metadata_cache
 from ..util.config import fetch_config_yml_path, read_yml, write_config_yml
+from ..util.fanout import resolve_account_ids, share_api
 from ..util.logger import set_log_config
+from ..util.metrics import enable_metrics, instrument_api
+from ..util.mockserver import run_mock_server
 
 
 def main():
@@ -104,6 +187,11 @@ def main():
     set_log_config(debug=args['--debug'], info=args['--info'])
     logger = logging.getLogger(__name__)
     logger.debug(f'args:{os.linesep}{args}')
+    if args.get('--metrics-port') or args.get('--metrics-interval'):
+        enable_metrics(
+            host=args['--metrics-host'], port=args['--metrics-port'],
+            interval=args['--metrics-interval']
+        )
     config_yml_path = fetch_config_yml_path(path=args['--file'])
     execute_command(args=args, config_yml_path=config_yml_path)
 
@@ -118,28 +206,71 @@ def execute_command(args, config_yml_path):
                 )
             )
         )
+    elif args.get('mock'):
+        run_mock_server(
+            port=args['--port'], tick_rate=args['--tick-rate'],
+            n_ticks=args['--ticks'], n_transactions=args['--transactions']
+        )
+    elif args.get('bench'):
+        run_benchmark(
+            n_ticks=args['--ticks'], n_transactions=args['--transactions'],
+            max_instruments=args['--max-instruments'],
+            use_redis=args['--use-redis'],
+            redis_host=(args['--redis-host'] or '127.0.0.1'),
+            redis_port=(args['--redis-port'] or 6379),
+            redis_db=(args['--redis-db'] or 0), print_json=args['--json']
+        )
+    elif args.get('resample'):
+        resample_candles(
+            data_path=args['<data_path>'], granularity=args['--granularity'],
+            instruments=args['<instrument>'], from_time=args['--from'],
+            to_time=args['--to'], csv_dir_path=args['--csv-dir'],
+            sqlite_path=args['--sqlite'], print_json=args['--json'],
+            quiet=args['--quiet']
+        )
+    elif args.get('compact'):
+        compact_sqlite(
+            sqlite_path=args['<data_path>'],
+            retention_days=args['--retention'], rollup=args['--rollup'],
+            batch_size=args['--batch-size'],
+            full_vacuum=args['--full-vacuum'], quiet=args['--quiet']
+        )
     else:
         config = read_yml(path=config_yml_path)
-        api = v20.Context(
-            hostname='{0}-fx{1}.oanda.com'.format(
-                ('stream' if args.get('stream') else 'api'),
-                config['oanda']['environment']
-            ),
-            token=config['oanda']['token']
+        api = _create_api(
+            config=config,
+            stream=(args.get('stream') or args.get('--stream'))
         )
         account_id = config['oanda'].get('account_id')
         instruments = (
             args.get('<instrument>') or config.get('instruments') or list()
         )
+        cache = create_metadata_cache(config=config)
         if args.get('info'):
             print_info(
                 api=api, account_id=account_id, instruments=instruments,
-                target=args['<info_target>'], print_json=args['--json']
+                target=args['<info_target>'], print_json=args['--json'],
+                cache=cache, refresh=args['--refresh'],
+                account_ids=_resolve_account_ids(
+                    args=args, config=config, api=api, cache=cache
+                ),
+                max_workers=int(args['--workers'])
+            )
+        elif args.get('spread') and args['--stream']:
+            monitor_spreads(
+                api=api, account_id=account_id, instruments=instruments,
+                windows=args['--windows'], interval=args['--interval'],
+                csv_path=args['--csv'], quiet=args['--quiet']
             )
         elif args.get('spread'):
             print_spread_ratios(
                 api=api, account_id=account_id, instruments=instruments,
-                csv_path=args['--csv'], quiet=args['--quiet']
+                csv_path=args['--csv'], quiet=args['--quiet'], cache=cache,
+                refresh=args['--refresh'],
+                account_ids=_resolve_account_ids(
+                    args=args, config=config, api=api, cache=cache
+                ),
+                max_workers=int(args['--workers'])
             )
         elif args.get('track'):
             track_rate(
@@ -160,6 +291,7 @@ def execute_command(args, config_yml_path):
                 redis_db=(args['--redis-db'] or rd.get('db')),
                 redis_max_llen=args['--redis-max-llen'],
                 ignore_api_error=args['--ignore-api-error'],
+                shards=args['--shards'], raw=args['--raw'],
                 quiet=args['--quiet']
             )
         elif args.get('transaction'):
@@ -167,8 +299,40 @@ def execute_command(args, config_yml_path):
                 api=api, account_id=account_id, from_time=args['--from'],
                 to_time=args['--to'], csv_path=args['--csv'],
                 sqlite_path=args['--sqlite'], pl_graph_path=args['--pl-graph'],
-                print_json=args['--json'], quiet=args['--quiet']
+                print_json=args['--json'], quiet=args['--quiet'],
+                account_ids=_resolve_account_ids(
+                    args=args, config=config, api=api, cache=cache
+                ),
+                max_workers=int(args['--workers'])
+            )
+        elif args.get('replay'):
+            rd = config.get('redis') or dict()
+            replay_stream(
+                api=api, data_path=args['<data_path>'],
+                instruments=instruments, target=args['--target'],
+                speed=args['--speed'], csv_path=args['--csv'],
+                sqlite_path=args['--sqlite'], use_redis=args['--use-redis'],
+                redis_host=(args['--redis-host'] or rd.get('host')),
+                redis_port=(args['--redis-port'] or rd.get('port')),
+                redis_db=(args['--redis-db'] or rd.get('db')),
+                redis_max_llen=args['--redis-max-llen'], quiet=args['--quiet']
             )
+        elif args.get('watch'):
+            watch_account(
+                api=api,
+                create_stream_api=lambda: _create_api(
+                    config=config, stream=True
+                ),
+                account_id=account_id, instruments=instruments,
+                interval=args['--interval']
+            )
+        elif args.get('cache'):
+            if args['--clear']:
+                print(f'Cache entries removed:\t{cache.invalidate()}')
+            else:
+                print(f'Cache directory:\t{cache.dir}')
+                for e in cache.entries():
+                    print('{0}\t{1:.0f} sec\t{2} bytes'.format(*e.values()))
         elif args.get('plotpl'):
             read_and_plot_pl(
                 data_path=args['<data_path>'], graph_path=args['<graph_path>']
@@ -177,3 +341,33 @@ def execute_command(args, config_yml_path):
             close_positions(
                 api=api, account_id=account_id, instruments=instruments
             )
+
+
+def _resolve_account_ids(args, config, api, cache=None):
+    oa = config['oanda']
+    account_ids = resolve_account_ids(
+        api=api, accounts=(args.get('--accounts') or oa.get('accounts')),
+        account_id=oa.get('account_id'), cache=cache,
+        refresh=args.get('--refresh')
+    )
+    if len(account_ids) > 1:
+        share_api(
+            api=api, max_workers=int(args['--workers']),
+            max_requests_per_sec=oa.get('max_requests_per_sec', 100)
+        )
+    return account_ids
+
+
+def _create_api(config, stream=False):
+    oa = config['oanda']
+    return instrument_api(
+        v20.Context(
+            hostname=(
+                oa.get('hostname') or '{0}-fx{1}.oanda.com'.format(
+                    ('stream' if stream else 'api'), oa['environment']
+                )
+            ),
+            port=int(oa.get('port') or 443), ssl=oa.get('ssl', True),
+            token=oa['token']
+        )
+    )
@@ -1,27 +1,45 @@
 -- SQL for streaming and tracking
 
+PRAGMA auto_vacuum = INCREMENTAL;
 
-CREATE TABLE pricing_stream (
+CREATE TABLE IF NOT EXISTS pricing_stream (
   time VARCHAR(30),
   instrument VARCHAR(7),
   json TEXT
 );
 
-CREATE INDEX ix_pricing_stream_time ON pricing_stream (time);
-CREATE INDEX ix_pricing_stream_inst ON pricing_stream (instrument);
+CREATE INDEX IF NOT EXISTS ix_pricing_stream_inst_time
+  ON pricing_stream (instrument, time);
 
 
-CREATE TABLE transaction_stream (
+CREATE TABLE IF NOT EXISTS transaction_stream (
   time VARCHAR(30),
   instrument VARCHAR(7),
   json TEXT
 );
 
-CREATE INDEX ix_transaction_stream_time ON transaction_stream (time);
-CREATE INDEX ix_transaction_stream_inst ON transaction_stream (instrument);
+CREATE INDEX IF NOT EXISTS ix_transaction_stream_time_inst
+  ON transaction_stream (time, instrument);
 
 
-CREATE TABLE candle (
+CREATE TABLE IF NOT EXISTS pricing_rollup (
+  time VARCHAR(30),
+  instrument VARCHAR(7),
+  granularity VARCHAR(3),
+  count INTEGER,
+  openBid DOUBLE PRECISION,
+  openAsk DOUBLE PRECISION,
+  highBid DOUBLE PRECISION,
+  highAsk DOUBLE PRECISION,
+  lowBid DOUBLE PRECISION,
+  lowAsk DOUBLE PRECISION,
+  closeBid DOUBLE PRECISION,
+  closeAsk DOUBLE PRECISION,
+  PRIMARY KEY(instrument, granularity, time)
+);
+
+
+CREATE TABLE IF NOT EXISTS candle (
   time VARCHAR(30),
   instrument VARCHAR(7),
   openBid DOUBLE PRECISION,
@@ -36,14 +54,15 @@ CREATE TABLE candle (
   PRIMARY KEY(instrument, time)
 );
 
-CREATE INDEX ix_candle_time ON candle (time);
-CREATE INDEX ix_candle_inst ON candle (instrument);
+CREATE INDEX IF NOT EXISTS ix_candle_time ON candle (time);
+CREATE INDEX IF NOT EXISTS ix_candle_inst ON candle (instrument);
 
 
-CREATE TABLE transaction_history (
+CREATE TABLE IF NOT EXISTS transaction_history (
+  account_id VARCHAR(20),
   id INTEGER,
   time VARCHAR(30),
   json TEXT
 );
 
-CREATE INDEX ix_transaction_history_id ON transaction_history (id);
+CREATE INDEX IF NOT EXISTS ix_transaction_history_id ON transaction_history (id);
@@ -0,0 +1,166 @@
+#!/usr/bin/env python
+
+import gzip
+import hashlib
+import json
+import logging
+import os
+import time
+from pathlib import Path
+
+from .logger import log_response
+
+
+class MetadataCache(object):
+    """On-disk cache of slowly changing API metadata.
+
+    Each entry is a gzip-compressed, minified JSON file holding the fetch
+    time and the decoded response body.  Entries older than the TTL are
+    fetched again on the next read.
+    """
+
+    def __init__(self, cache_dir=None, ttl=86400, namespace='default'):
+        self.__logger = logging.getLogger(__name__)
+        self.__dir = Path(cache_dir or fetch_default_cache_dir()).joinpath(
+            namespace
+        ).resolve()
+        self.__ttl = float(ttl)
+
+    @property
+    def dir(self):
+        return self.__dir
+
+    def get(self, key, fetch, ttl=None, refresh=False):
+        ttl = self.__ttl if ttl is None else float(ttl)
+        entry = None if refresh else self._read(key)
+        if entry:
+            age = time.time() - entry['fetched_at']
+            if age <= ttl:
+                self.__logger.debug(f'Cache hit:\t{key}\t({age:.0f} sec)')
+                return entry['data']
+        self.__logger.debug(f'Cache miss:\t{key}')
+        data = fetch()
+        self.put(key=key, data=data)
+        return data
+
+    def peek(self, key):
+        entry = self._read(key)
+        return entry['data'] if entry else None
+
+    def _read(self, key):
+        path = self._path(key)
+        try:
+            with gzip.open(path, 'rt') as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return None
+        except (OSError, ValueError) as e:
+            self.__logger.warning(f'Broken cache entry:\t{path}\t{e}')
+            return None
+
+    def put(self, key, data):
+        path = self._path(key)
+        tmp = path.with_name(f'.{path.name}.{os.getpid()}')
+        try:
+            path.parent.mkdir(parents=True, exist_ok=True)
+            with gzip.open(tmp, 'wt') as f:
+                json.dump(
+                    {'fetched_at': time.time(), 'data': data}, f,
+                    separators=(',', ':')
+                )
+            os.replace(tmp, path)
+        except OSError as e:
+            self.__logger.warning(f'Cache write skipped:\t{path}\t{e}')
+            return False
+        else:
+            return True
+
+    def invalidate(self, key=None):
+        paths = (
+            [self._path(key)] if key else list(self.__dir.glob('*.json.gz'))
+        )
+        n_removed = 0
+        for p in paths:
+            try:
+                p.unlink()
+            except FileNotFoundError:
+                pass
+            else:
+                self.__logger.info(f'Removed a cache entry:\t{p}')
+                n_removed += 1
+        return n_removed
+
+    def entries(self):
+        now = time.time()
+        return [
+            {
+                'key': p.name[:-len('.json.gz')],
+                'age_sec': now - p.stat().st_mtime, 'bytes': p.stat().st_size
+            } for p in sorted(self.__dir.glob('*.json.gz'))
+        ]
+
+    def _path(self, key):
+        return self.__dir.joinpath(f'{key}.json.gz')
+
+
+def fetch_default_cache_dir(env='XDG_CACHE_HOME'):
+    return str(
+        Path(os.getenv(env) or Path.home().joinpath('.cache')).joinpath(
+            'oanda-cli'
+        )
+    )
+
+
+def create_metadata_cache(config):
+    oa = config['oanda']
+    cc = config.get('cache') or dict()
+    return MetadataCache(
+        cache_dir=cc.get('dir'), ttl=cc.get('ttl', 86400),
+        namespace=(
+            oa.get('hostname') or oa['environment']
+        ) + '-' + hashlib.sha1(oa['token'].encode()).hexdigest()[:8]
+    )
+
+
+def fetch_instruments(api, account_id, cache=None, refresh=False):
+    def fetch():
+        res = api.account.instruments(accountID=account_id)
+        log_response(res, logger=logging.getLogger(__name__))
+        if not 100 <= res.status <= 399:
+            raise RuntimeError(f'unexpected response:\t{res.status}')
+        return json.loads(res.raw_body)
+
+    if cache:
+        return cache.get(
+            key=f'instruments.{account_id}', fetch=fetch, refresh=refresh
+        )
+    else:
+        return fetch()
+
+
+def fetch_accounts(api, cache=None, refresh=False):
+    def fetch():
+        res = api.account.list()
+        log_response(res, logger=logging.getLogger(__name__))
+        if not 100 <= res.status <= 399:
+            raise RuntimeError(f'unexpected response:\t{res.status}')
+        return json.loads(res.raw_body)
+
+    if cache:
+        return cache.get(key='accounts', fetch=fetch, refresh=refresh)
+    else:
+        return fetch()
+
+
+def lookup_cached_instrument(cache, account_id, instrument):
+    """Return cached metadata of an instrument without calling the API.
+
+    None is returned when the instruments of the account have not been
+    cached yet (e.g., by `oanda-cli info instruments`).  Stale entries are
+    still used, since precisions and units rarely change.
+    """
+    data = cache.peek(key=f'instruments.{account_id}')
+    return (
+        {o['name']: o for o in data['instruments']}.get(instrument)
+        if data else None
+    )
@@ -0,0 +1,89 @@
+#!/usr/bin/env python
+
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from requests.adapters import HTTPAdapter
+
+from .cache import fetch_accounts
+
+
+class RateLimiter(object):
+    """Token bucket shared by threads issuing API requests.
+
+    acquire() blocks until a token is available, so the combined request
+    rate of all workers stays under the limit while short bursts up to the
+    bucket size pass without waiting.
+    """
+
+    def __init__(self, rate=100, burst=None):
+        self.__rate = float(rate)
+        self.__capacity = float(burst or rate)
+        self.__tokens = self.__capacity
+        self.__last_time = time.monotonic()
+        self.__lock = threading.Lock()
+
+    def acquire(self):
+        while True:
+            with self.__lock:
+                now = time.monotonic()
+                self.__tokens = min(
+                    self.__capacity,
+                    self.__tokens + (now - self.__last_time) * self.__rate
+                )
+                self.__last_time = now
+                if self.__tokens >= 1:
+                    self.__tokens -= 1
+                    return
+                wait = (1 - self.__tokens) / self.__rate
+            time.sleep(wait)
+
+
+def share_api(api, max_workers=8, max_requests_per_sec=100):
+    logger = logging.getLogger(__name__)
+    logger.info(
+        f'Share an API context:\t{max_workers} workers,'
+        f' {max_requests_per_sec} requests/sec'
+    )
+    adapter = HTTPAdapter(pool_connections=1, pool_maxsize=int(max_workers))
+    for prefix in ['http://', 'https://']:
+        api._session.mount(prefix, adapter)
+    limiter = RateLimiter(rate=max_requests_per_sec)
+    request = api.request
+
+    def limited_request(req):
+        limiter.acquire()
+        return request(req)
+
+    api.request = limited_request
+    return api
+
+
+def resolve_account_ids(api, accounts=None, account_id=None, cache=None,
+                        refresh=False):
+    if not accounts:
+        ids = [str(account_id)] if account_id else list()
+    elif accounts == 'all':
+        ids = [
+            o['id'] for o in fetch_accounts(
+                api=api, cache=cache, refresh=refresh
+            )['accounts']
+        ]
+    elif isinstance(accounts, str):
+        ids = [s.strip() for s in accounts.split(',') if s.strip()]
+    else:
+        ids = [str(a) for a in accounts]
+    logging.getLogger(__name__).debug(f'account_ids:\t{ids}')
+    return ids
+
+
+def map_accounts(func, account_ids, max_workers=8):
+    logger = logging.getLogger(__name__)
+    if len(account_ids) < 2:
+        return {a: func(a) for a in account_ids}
+    logger.info(f'Fan out to {len(account_ids)} accounts')
+    with ThreadPoolExecutor(
+            max_workers=min(int(max_workers), len(account_ids))) as executor:
+        return dict(zip(account_ids, executor.map(func, account_ids)))
@@ -1,8 +1,6 @@
 #!/usr/bin/env python
 
 import logging
-import os
-from pprint import pformat
 
 
 def set_log_config(debug=None, info=None):
@@ -18,11 +16,53 @@ def set_log_config(debug=None, info=None):
     )
 
 
-def log_response(response, logger=None, expected_status_range=(100, 399)):
+def log_response(response, logger=None, expected_status_range=(100, 399),
+                 max_body_chars=1000):
     logger = logger or logging.getLogger(__name__)
-    res_str = 'response =>' + os.linesep + pformat(vars(response))
     esr = sorted(expected_status_range)
-    if esr[0] <= response.status <= esr[-1]:
-        logger.debug(res_str)
+    lv = (
+        logging.DEBUG if esr[0] <= response.status <= esr[-1]
+        else logging.ERROR
+    )
+    if logger.isEnabledFor(lv):
+        logger.log(
+            lv, 'response =>\t%s',
+            summarize_response(response, max_body_chars=max_body_chars)
+        )
+
+
+def summarize_response(response, max_body_chars=1000):
+    request = getattr(response, 'request', None)
+    raw_body = response.raw_body or ''
+    elapsed = getattr(response, 'elapsed', None)
+    summary = '{0} {1} {2} {3}'.format(
+        response.method, getattr(request, 'base_path', response.path),
+        response.status, response.reason
+    ) + (f' {elapsed:.3f} sec' if elapsed is not None else '') + (
+        f' {len(raw_body)} bytes' if response.raw_body is not None
+        else ' (stream)'
+    )
+    if raw_body and max_body_chars:
+        return summary + '\t' + (
+            raw_body if len(raw_body) <= max_body_chars
+            else raw_body[:max_body_chars] + '...'
+        )
     else:
-        logger.error(res_str)
+        return summary
+
+
+class SampledLogger(object):
+    def __init__(self, logger, every=100, level=logging.DEBUG):
+        self.__logger = logger
+        self.__every = max(int(every), 1)
+        self.__level = level
+        self.__enabled = logger.isEnabledFor(level)
+        self.__count = 0
+
+    def log(self, msg):
+        if self.__enabled:
+            self.__count += 1
+            if self.__count % self.__every == 1 or self.__every == 1:
+                self.__logger.log(
+                    self.__level, '%s\t(sampled: 1/%d)', msg, self.__every
+                )
@@ -0,0 +1,246 @@
+#!/usr/bin/env python
+
+import atexit
+import calendar
+import json
+import logging
+import sys
+import threading
+import time
+from bisect import bisect_left
+from collections import defaultdict
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+DEFAULT_BUCKETS = (
+    1e-6, 2.5e-6, 5e-6, 1e-5, 2.5e-5, 5e-5, 1e-4, 2.5e-4, 5e-4, 1e-3,
+    2.5e-3, 5e-3, 1e-2, 2.5e-2, 5e-2, 0.1, 0.25, 0.5, 1, 2.5, 5, 10
+)
+_METRICS = None
+
+
+class Metrics(object):
+    """In-process counters, gauges, and fixed-bucket histograms.
+
+    Metrics are only collected after enable_metrics() is called.  Hot paths
+    fetch the registry with get_metrics() once and skip instrumentation when
+    it returns None, so a disabled registry costs a single truth test.
+    """
+
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.__lock = threading.Lock()
+        self.__buckets = tuple(sorted(buckets))
+        self.__counters = defaultdict(float)
+        self.__gauges = dict()
+        self.__histograms = dict()
+        self.__last_counters = dict()
+        self.__last_time = time.monotonic()
+
+    def inc(self, name, value=1, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self.__lock:
+            self.__counters[key] += value
+
+    def set(self, name, value, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self.__lock:
+            self.__gauges[key] = value
+
+    def observe(self, name, value, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        i = bisect_left(self.__buckets, value)
+        with self.__lock:
+            h = self.__histograms.get(key)
+            if h is None:
+                h = self.__histograms[key] = [
+                    [0] * (len(self.__buckets) + 1), 0.0, 0
+                ]
+            h[0][i] += 1
+            h[1] += value
+            h[2] += 1
+
+    def lap(self, name, start, **labels):
+        now = time.perf_counter()
+        self.observe(name, now - start, **labels)
+        return now
+
+    def timed(self, func, name, **labels):
+        def wrapper(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                self.observe(name, time.perf_counter() - start, **labels)
+        return wrapper
+
+    def to_prometheus(self):
+        with self.__lock:
+            counters = dict(self.__counters)
+            gauges = dict(self.__gauges)
+            histograms = {
+                k: [list(v[0]), v[1], v[2]]
+                for k, v in self.__histograms.items()
+            }
+        lines = list()
+        for t, d in [('counter', counters), ('gauge', gauges)]:
+            for n in sorted({k[0] for k in d}):
+                lines.append(f'# TYPE {n} {t}')
+                lines.extend([
+                    f'{n}{_format_labels(k[1])} {v}'
+                    for k, v in sorted(d.items()) if k[0] == n
+                ])
+        for n in sorted({k[0] for k in histograms}):
+            lines.append(f'# TYPE {n} histogram')
+            for k, (counts, total, count) in sorted(histograms.items()):
+                if k[0] != n:
+                    continue
+                cum = 0
+                for le, c in zip([*self.__buckets, '+Inf'], counts):
+                    cum += c
+                    lines.append(
+                        f'{n}_bucket{_format_labels(k[1], le=le)} {cum}'
+                    )
+                lines.append(f'{n}_sum{_format_labels(k[1])} {total}')
+                lines.append(f'{n}_count{_format_labels(k[1])} {count}')
+        return '\n'.join(lines) + '\n'
+
+    def to_dict(self):
+        now = time.monotonic()
+        with self.__lock:
+            counters = {
+                f'{k[0]}{_format_labels(k[1])}': v
+                for k, v in self.__counters.items()
+            }
+            gauges = {
+                f'{k[0]}{_format_labels(k[1])}': v
+                for k, v in self.__gauges.items()
+            }
+            histograms = {
+                f'{k[0]}{_format_labels(k[1])}': {
+                    'count': count, 'mean': (total / count if count else 0),
+                    **{
+                        f'p{q}': self._quantile(counts, count, q / 100)
+                        for q in [50, 90, 99]
+                    }
+                } for k, (counts, total, count) in self.__histograms.items()
+            }
+            elapsed = (now - self.__last_time) or 1
+            rates = {
+                k: (v - self.__last_counters.get(k, 0)) / elapsed
+                for k, v in counters.items()
+            }
+            self.__last_counters = counters
+            self.__last_time = now
+        return {
+            'counters': counters, 'rates_per_sec': rates, 'gauges': gauges,
+            'histograms': histograms
+        }
+
+    def _quantile(self, counts, count, q):
+        target = q * count
+        cum = 0
+        for le, c in zip(self.__buckets, counts):
+            cum += c
+            if cum >= target:
+                return le
+        return float('inf')
+
+    def serve_prometheus(self, port, host='127.0.0.1'):
+        metrics = self
+
+        class _Handler(BaseHTTPRequestHandler):
+            def do_GET(self):  # noqa: N802
+                body = metrics.to_prometheus().encode()
+                self.send_response(200)
+                self.send_header('Content-Type', 'text/plain; version=0.0.4')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                logging.getLogger(__name__).debug(format % args)
+
+        server = ThreadingHTTPServer((host, int(port)), _Handler)
+        server.daemon_threads = True
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        return server
+
+    def print_json(self, file=sys.stderr):
+        print(
+            json.dumps({'time': time.time(), **self.to_dict()}),
+            file=file, flush=True
+        )
+
+    def print_json_periodically(self, interval, file=sys.stderr):
+        def loop():
+            while True:
+                time.sleep(float(interval))
+                self.print_json(file=file)
+
+        threading.Thread(target=loop, daemon=True).start()
+        atexit.register(self.print_json, file=file)
+
+
+def _format_labels(labels, **extra):
+    items = [*labels, *extra.items()]
+    if items:
+        return '{' + ','.join(f'{k}="{v}"' for k, v in items) + '}'
+    else:
+        return ''
+
+
+def enable_metrics(port=None, interval=None, host='127.0.0.1'):
+    global _METRICS
+    logger = logging.getLogger(__name__)
+    _METRICS = Metrics()
+    if port:
+        logger.info(f'Serve metrics:\t{host}:{port}')
+        _METRICS.serve_prometheus(port=port, host=host)
+    if interval:
+        logger.info(f'Print metrics every {interval} sec')
+        _METRICS.print_json_periodically(interval=interval)
+    return _METRICS
+
+
+def get_metrics():
+    return _METRICS
+
+
+class TimedRequest(object):
+    """Picklable wrapper of Context.request that records request latency.
+
+    The wrapped context can be sent to a child process; the registry is
+    not pickled and the child looks up its own one with get_metrics().
+    """
+
+    def __init__(self, request, metrics=None):
+        self.request = request
+        self.metrics = metrics
+
+    def __call__(self, req):
+        start = time.perf_counter()
+        res = self.request(req)
+        res.elapsed = time.perf_counter() - start
+        metrics = self.metrics or get_metrics()
+        if metrics:
+            metrics.observe(
+                'oandacli_api_request_seconds', res.elapsed,
+                method=req.method, endpoint=req.base_path
+            )
+        return res
+
+    def __reduce__(self):
+        return (self.__class__, (self.request,))
+
+
+def instrument_api(api, metrics=None):
+    api.request = TimedRequest(request=api.request, metrics=metrics)
+    return api
+
+
+def rfc3339_to_epoch(t):
+    sec = calendar.timegm((
+        int(t[0:4]), int(t[5:7]), int(t[8:10]), int(t[11:13]),
+        int(t[14:16]), int(t[17:19])
+    ))
+    frac = t[19:].rstrip('Z')
+    return sec + (float('0' + frac) if frac.startswith('.') else 0)
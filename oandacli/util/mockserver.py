@@ -0,0 +1,388 @@
+#!/usr/bin/env python
+
+import json
+import logging
+import random
+import re
+import threading
+import time
+from datetime import datetime, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+GRANULARITY_SECONDS = {
+    'S5': 5, 'S10': 10, 'S15': 15, 'S30': 30, 'M1': 60, 'M2': 120,
+    'M4': 240, 'M5': 300, 'M10': 600, 'M15': 900, 'M30': 1800, 'H1': 3600,
+    'H2': 7200, 'H3': 10800, 'H4': 14400, 'H6': 21600, 'H8': 28800,
+    'H12': 43200, 'D': 86400, 'W': 604800, 'M': 2592000
+}
+
+
+class MockV20Server(ThreadingHTTPServer):
+    """Local stand-in for the Oanda v20 REST and streaming endpoints."""
+
+    daemon_threads = True
+
+    def __init__(self, host='127.0.0.1', port=0, tick_rate=0, n_ticks=20000,
+                 n_transactions=5000, page_size=1000, instruments=None,
+                 account_ids=None):
+        super().__init__((host, int(port)), MockV20RequestHandler)
+        self.tick_rate = float(tick_rate or 0)
+        self.n_ticks = int(n_ticks)
+        self.n_transactions = int(n_transactions)
+        self.page_size = int(page_size)
+        self.instruments = instruments or ['EUR_USD', 'USD_JPY']
+        self.account_ids = account_ids or ['101-001-100000-001']
+
+    @property
+    def url(self):
+        return 'http://{0}:{1}'.format(*self.server_address[:2])
+
+    def start_in_thread(self):
+        th = threading.Thread(target=self.serve_forever, daemon=True)
+        th.start()
+        return th
+
+
+class MockV20RequestHandler(BaseHTTPRequestHandler):
+    def log_message(self, format, *args):
+        logging.getLogger(__name__).debug(format % args)
+
+    def do_GET(self):  # noqa: N802
+        url = urlparse(self.path)
+        query = {k: v[-1] for k, v in parse_qs(url.query).items()}
+        routes = [
+            (r'/v3/instruments/(?P<instrument>[^/]+)/candles', self._candles),
+            (r'/v3/accounts', self._accounts),
+            (r'/v3/accounts/(?P<account_id>[^/]+)', self._account),
+            (r'/v3/accounts/(?P<account_id>[^/]+)/summary', self._account),
+            (r'/v3/accounts/(?P<account_id>[^/]+)/instruments',
+             self._instruments),
+            (r'/v3/accounts/(?P<account_id>[^/]+)/pricing', self._pricing),
+            (r'/v3/accounts/(?P<account_id>[^/]+)/pricing/stream',
+             self._pricing_stream),
+            (r'/v3/accounts/(?P<account_id>[^/]+)/transactions',
+             self._transaction_pages),
+            (r'/v3/accounts/(?P<account_id>[^/]+)/transactions/idrange',
+             self._transaction_range),
+            (r'/v3/accounts/(?P<account_id>[^/]+)/transactions/sinceid',
+             self._transaction_since),
+            (r'/v3/accounts/(?P<account_id>[^/]+)/transactions/stream',
+             self._transaction_stream),
+            (r'/v3/accounts/(?P<account_id>[^/]+)/(?:positions|openPositions)',
+             self._positions),
+            (r'/v3/accounts/(?P<account_id>[^/]+)/positions/'
+             r'(?P<instrument>[^/]+)', self._position)
+        ]
+        for pattern, func in routes:
+            m = re.fullmatch(pattern, url.path)
+            if m:
+                func(query=query, **m.groupdict())
+                break
+        else:
+            self._send_json({'errorMessage': 'Not found'}, status=404)
+
+    def do_PUT(self):  # noqa: N802
+        url = urlparse(self.path)
+        m = re.fullmatch(
+            r'/v3/accounts/(?P<account_id>[^/]+)/positions/'
+            r'(?P<instrument>[^/]+)/close', url.path
+        )
+        length = int(self.headers.get('Content-Length') or 0)
+        if length:
+            self.rfile.read(length)
+        if m:
+            self._send_json({
+                'longOrderCreateTransaction': None,
+                'relatedTransactionIDs': [],
+                'lastTransactionID': str(self.server.n_transactions)
+            })
+        else:
+            self._send_json({'errorMessage': 'Not found'}, status=404)
+
+    def _send_json(self, data, status=200):
+        body = json.dumps(data).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _candles(self, query, instrument):
+        count = int(query.get('count', 500))
+        granularity = query.get('granularity', 'S5')
+        step = GRANULARITY_SECONDS.get(granularity, 5)
+        rnd = random.Random(instrument)
+        t0 = (int(time.time()) // step - count) * step
+        mid = 100.0
+        candles = list()
+        for i in range(count):
+            o = mid
+            mid += rnd.gauss(0, 0.01)
+            hi, lo = max(o, mid) + 0.005, min(o, mid) - 0.005
+            candles.append({
+                'time': _format_time(t0 + i * step), 'volume': 10,
+                'complete': True,
+                **{
+                    k: {
+                        'o': f'{o + d:.5f}', 'h': f'{hi + d:.5f}',
+                        'l': f'{lo + d:.5f}', 'c': f'{mid + d:.5f}'
+                    } for k, d in [('bid', -0.01), ('ask', 0.01)]
+                }
+            })
+        self._send_json({
+            'instrument': instrument, 'granularity': granularity,
+            'candles': candles
+        })
+
+    def _accounts(self, query):
+        self._send_json({
+            'accounts': [
+                {'id': i, 'tags': []} for i in self.server.account_ids
+            ]
+        })
+
+    def _account(self, query, account_id):
+        self._send_json({
+            'account': {
+                'id': account_id, 'currency': 'USD', 'balance': '100000.0',
+                'NAV': '100000.0', 'unrealizedPL': '0.0', 'pl': '0.0',
+                'marginUsed': '0.0', 'marginAvailable': '100000.0',
+                'openTradeCount': 0, 'openPositionCount': 0,
+                'pendingOrderCount': 0, 'trades': [], 'positions': [],
+                'orders': [],
+                'lastTransactionID': str(self.server.n_transactions)
+            },
+            'lastTransactionID': str(self.server.n_transactions)
+        })
+
+    def _instruments(self, query, account_id):
+        names = (
+            query['instruments'].split(',') if query.get('instruments')
+            else self.server.instruments
+        )
+        self._send_json({
+            'instruments': [
+                {
+                    'name': n, 'type': 'CURRENCY',
+                    'displayName': n.replace('_', '/'),
+                    'pipLocation': (-2 if n.endswith('JPY') else -4),
+                    'displayPrecision': (3 if n.endswith('JPY') else 5),
+                    'tradeUnitsPrecision': 0, 'marginRate': '0.04'
+                } for n in names
+            ],
+            'lastTransactionID': str(self.server.n_transactions)
+        })
+
+    def _pricing(self, query, account_id):
+        insts = [n for n in query.get('instruments', '').split(',') if n]
+        conversions = (
+            {
+                'homeConversions': [
+                    _home_conversion(currency=c) for c
+                    in sorted({c for n in insts for c in n.split('_')})
+                ]
+            } if query.get('includeHomeConversions', '').lower() == 'true'
+            else dict()
+        )
+        self._send_json({
+            'prices': [
+                _price(instrument=n, mid=100.0, t=time.time()) for n in insts
+            ],
+            **conversions, 'time': _format_time(time.time())
+        })
+
+    def _pricing_stream(self, query, account_id):
+        insts = query.get('instruments', '').split(',')
+        interval = (
+            1 / self.server.tick_rate if self.server.tick_rate > 0 else 0
+        )
+        rnd = random.Random(0)
+        mids = {i: 100.0 for i in insts}
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/octet-stream')
+        self.end_headers()
+        t_start = time.time()
+        try:
+            for n in range(self.server.n_ticks):
+                if interval:
+                    wait = t_start + n * interval - time.time()
+                    if wait > 0:
+                        time.sleep(wait)
+                inst = insts[n % len(insts)]
+                mids[inst] += rnd.gauss(0, 0.01)
+                lines = [
+                    json.dumps(
+                        _price(instrument=inst, mid=mids[inst], t=time.time())
+                    )
+                ]
+                if n % 1000 == 0:
+                    lines.append(json.dumps({
+                        'type': 'HEARTBEAT', 'time': _format_time(time.time())
+                    }))
+                self.wfile.write(''.join(f'{s}\n' for s in lines).encode())
+        except (BrokenPipeError, ConnectionResetError):
+            pass
+        self.close_connection = True
+
+    def _transaction_pages(self, query, account_id):
+        n = self.server.n_transactions
+        size = self.server.page_size
+        self._send_json({
+            'from': _format_time(0), 'to': _format_time(time.time()),
+            'pageSize': size, 'count': n,
+            'pages': [
+                '{0}/v3/accounts/{1}/transactions/idrange?from={2}&to={3}'
+                .format(
+                    self.server.url, account_id, i + 1, min(i + size, n)
+                ) for i in range(0, n, size)
+            ],
+            'lastTransactionID': str(n)
+        })
+
+    def _transaction_range(self, query, account_id):
+        from_id = int(query.get('from', 1))
+        to_id = min(int(query.get('to', from_id)), self.server.n_transactions)
+        insts = self.server.instruments
+        t0 = time.time() - self.server.n_transactions
+        self._send_json({
+            'transactions': [
+                {
+                    'id': str(i), 'type': 'ORDER_FILL',
+                    'time': _format_time(t0 + i), 'accountID': account_id,
+                    'instrument': insts[i % len(insts)],
+                    'units': ('1000' if i % 2 else '-1000'),
+                    'price': '100.00000', 'reason': 'MARKET_ORDER',
+                    'pl': f'{((i * 7919) % 200 - 100) / 10:.4f}',
+                    'financing': '0.0000',
+                    'accountBalance': f'{100000 + i:.4f}',
+                    'tradeOpened': {
+                        'tradeID': str(i), 'units': '1000',
+                        'price': '100.00000',
+                        'initialMarginRequired': '40.0000'
+                    }
+                } for i in range(from_id, to_id + 1)
+            ],
+            'lastTransactionID': str(self.server.n_transactions)
+        })
+
+    def _transaction_since(self, query, account_id):
+        self._send_json({
+            'transactions': [],
+            'lastTransactionID': str(self.server.n_transactions)
+        })
+
+    def _transaction_stream(self, query, account_id):
+        interval = (
+            1 / self.server.tick_rate if self.server.tick_rate > 0 else 0
+        )
+        insts = self.server.instruments
+        balance = 100000.0
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/octet-stream')
+        self.end_headers()
+        t_start = time.time()
+        try:
+            self.wfile.write((json.dumps({
+                'type': 'HEARTBEAT', 'time': _format_time(time.time()),
+                'lastTransactionID': str(self.server.n_transactions)
+            }) + '\n').encode())
+            for n in range(self.server.n_ticks):
+                if interval:
+                    wait = t_start + n * interval - time.time()
+                    if wait > 0:
+                        time.sleep(wait)
+                txn_id = self.server.n_transactions + n + 1
+                opening = (n // len(insts)) % 2 == 0
+                pl = 0.0 if opening else 1.0
+                balance += pl
+                txn = {
+                    'id': str(txn_id), 'type': 'ORDER_FILL',
+                    'time': _format_time(time.time()),
+                    'accountID': account_id,
+                    'instrument': insts[n % len(insts)], 'units': '1000',
+                    'price': '100.00000', 'reason': 'MARKET_ORDER',
+                    'pl': f'{pl:.4f}', 'accountBalance': f'{balance:.4f}'
+                }
+                trade_id = str(txn_id - len(insts) if not opening else txn_id)
+                if opening:
+                    txn['tradeOpened'] = {
+                        'tradeID': trade_id, 'units': '1000',
+                        'price': '100.00000',
+                        'initialMarginRequired': '40.0000'
+                    }
+                else:
+                    txn['units'] = '-1000'
+                    txn['tradesClosed'] = [
+                        {'tradeID': trade_id, 'units': '-1000',
+                         'realizedPL': f'{pl:.4f}'}
+                    ]
+                self.wfile.write((json.dumps(txn) + '\n').encode())
+        except (BrokenPipeError, ConnectionResetError):
+            pass
+        self.close_connection = True
+
+    def _positions(self, query, account_id):
+        self._send_json({
+            'positions': [
+                _position(instrument=i) for i in self.server.instruments
+            ],
+            'lastTransactionID': str(self.server.n_transactions)
+        })
+
+    def _position(self, query, account_id, instrument):
+        self._send_json({
+            'position': _position(instrument=instrument),
+            'lastTransactionID': str(self.server.n_transactions)
+        })
+
+
+def _format_time(t):
+    return datetime.fromtimestamp(t, tz=timezone.utc).strftime(
+        '%Y-%m-%dT%H:%M:%S.%f000Z'
+    )
+
+
+def _price(instrument, mid, t):
+    bid, ask = f'{mid - 0.01:.5f}', f'{mid + 0.01:.5f}'
+    return {
+        'type': 'PRICE', 'instrument': instrument, 'time': _format_time(t),
+        'tradeable': True,
+        'bids': [{'price': bid, 'liquidity': 1000000}],
+        'asks': [{'price': ask, 'liquidity': 1000000}],
+        'closeoutBid': bid, 'closeoutAsk': ask
+    }
+
+
+def _home_conversion(currency, home_currency='USD'):
+    rate = 1.0 if currency == home_currency else 0.01
+    return {
+        'currency': currency, 'accountGain': f'{rate:.8f}',
+        'accountLoss': f'{rate:.8f}', 'positionValue': f'{rate:.8f}'
+    }
+
+
+def _position(instrument):
+    return {
+        'instrument': instrument, 'pl': '0.0', 'unrealizedPL': '0.0',
+        'marginUsed': '40.0',
+        'long': {'units': '1000', 'averagePrice': '100.00000', 'pl': '0.0',
+                 'unrealizedPL': '0.0', 'tradeIDs': ['1']},
+        'short': {'units': '0', 'pl': '0.0', 'unrealizedPL': '0.0'}
+    }
+
+
+def run_mock_server(host='127.0.0.1', port=8080, tick_rate=0, n_ticks=20000,
+                    n_transactions=5000):
+    logger = logging.getLogger(__name__)
+    server = MockV20Server(
+        host=host, port=port, tick_rate=tick_rate, n_ticks=n_ticks,
+        n_transactions=n_transactions
+    )
+    print(f'Mock v20 server:\t{server.url}', flush=True)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        logger.info('Stop the mock server')
+    finally:
+        server.server_close()
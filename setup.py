@@ -19,6 +19,7 @@ setup(
     packages=find_packages(),
     include_package_data=True,
     install_requires=['docopt', 'pandas', 'pyyaml', 'redis', 'seaborn', 'v20'],
+    extras_require={'fast': ['orjson']},
     entry_points={'console_scripts': ['oanda-cli=oandacli.cli.main:main']},
     classifiers=[
         'Development Status :: 4 - Beta',
@@ -0,0 +1,40 @@
+#!/usr/bin/env python
+
+from oandacli.util.cache import MetadataCache, lookup_cached_instrument
+
+
+def _fail():
+    raise AssertionError('unexpected fetch')
+
+
+def test_lookup_cached_instrument(tmp_path):
+    cache = MetadataCache(cache_dir=str(tmp_path))
+    assert lookup_cached_instrument(
+        cache=cache, account_id='001', instrument='EUR_USD'
+    ) is None
+    cache.put(
+        key='instruments.001',
+        data={
+            'instruments': [
+                {'name': 'EUR_USD', 'displayPrecision': 5},
+                {'name': 'USD_JPY', 'displayPrecision': 3}
+            ]
+        }
+    )
+    assert lookup_cached_instrument(
+        cache=cache, account_id='001', instrument='USD_JPY'
+    ) == {'name': 'USD_JPY', 'displayPrecision': 3}
+    assert lookup_cached_instrument(
+        cache=cache, account_id='001', instrument='GBP_USD'
+    ) is None
+    assert cache.get(key='instruments.001', fetch=_fail)['instruments']
+
+
+def test_invalidate_counts_removed_files(tmp_path):
+    cache = MetadataCache(cache_dir=str(tmp_path))
+    assert cache.invalidate(key='accounts') == 0
+    cache.put(key='accounts', data={'accounts': []})
+    cache.put(key='instruments.001', data={'instruments': []})
+    assert cache.invalidate(key='accounts') == 1
+    assert cache.invalidate() == 1
+    assert cache.entries() == []
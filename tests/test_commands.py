@@ -0,0 +1,133 @@
+#!/usr/bin/env python
+
+import json
+import os
+import sqlite3
+import subprocess
+import sys
+
+import pytest
+import yaml
+
+from oandacli.util.mockserver import MockV20Server
+
+INSTRUMENTS = ['EUR_USD', 'USD_JPY', 'GBP_USD', 'AUD_USD']
+
+
+@pytest.fixture(scope='module')
+def mock_server():
+    server = MockV20Server(n_ticks=200, n_transactions=100)
+    server.start_in_thread()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.fixture
+def config_yml(mock_server, tmp_path):
+    return _write_config(server=mock_server, tmp_path=tmp_path)
+
+
+def _write_config(server, tmp_path):
+    path = tmp_path.joinpath('oanda.yml')
+    with open(path, 'w') as f:
+        yaml.dump(
+            {
+                'oanda': {
+                    'environment': 'practice', 'token': 'mock',
+                    'account_id': server.account_ids[0],
+                    'hostname': server.server_address[0],
+                    'port': server.server_address[1], 'ssl': False
+                },
+                'cache': {'dir': str(tmp_path.joinpath('cache'))}
+            }, f
+        )
+    return path
+
+
+def _run_cli(*argv, config_yml, timeout=60, check=True):
+    return subprocess.run(
+        [
+            sys.executable, '-c', 'from oandacli.cli.main import main; main()',
+            *argv
+        ],
+        env={**os.environ, 'OANDA_YML': str(config_yml)},
+        stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True,
+        timeout=timeout, check=check
+    )
+
+
+def _count_rows(sqlite_path, table):
+    with sqlite3.connect(str(sqlite_path)) as con:
+        return con.execute(f'SELECT COUNT(*) FROM {table};').fetchone()[0]
+
+
+def test_stream_replay_and_compact(config_yml, tmp_path):
+    db = tmp_path.joinpath('stream.db')
+    _run_cli(
+        'stream', '--quiet', '--raw', '--shards=2', f'--sqlite={db}',
+        *INSTRUMENTS, config_yml=config_yml
+    )
+    n_ticks = _count_rows(db, 'pricing_stream')
+    assert n_ticks > 0
+    csv_path = tmp_path.joinpath('replay.csv')
+    _run_cli(
+        'replay', '--quiet', f'--csv={csv_path}', str(db),
+        config_yml=config_yml
+    )
+    with open(csv_path) as f:
+        times = [r.split(',', 1)[0] for r in f.readlines()[1:]]
+    assert len(times) == n_ticks
+    assert times == sorted(times)
+    report = json.loads(
+        _run_cli(
+            'compact', '--retention=-1', str(db), config_yml=config_yml
+        ).stdout
+    )
+    assert sum(
+        v['deleted_ticks'] for v in report['instruments'].values()
+    ) == n_ticks
+    assert _count_rows(db, 'pricing_rollup') > 0
+
+
+def test_track_and_resample(config_yml, tmp_path):
+    db = tmp_path.joinpath('candle.db')
+    _run_cli(
+        'track', '--quiet', '--count=500', f'--sqlite={db}', 'EUR_USD',
+        config_yml=config_yml
+    )
+    bars = json.loads(
+        _run_cli(
+            'resample', '--granularity=M5', '--json', f'--sqlite={db}',
+            str(db), config_yml=config_yml
+        ).stdout
+    )['EUR_USD']
+    assert bars and all(b['volume'] == 600 for b in bars)
+    assert _count_rows(db, 'candle_M5') == len(bars)
+    assert _count_rows(db, 'candle') == 500
+
+
+def test_spread_stream(config_yml, tmp_path):
+    csv_path = tmp_path.joinpath('spread.csv')
+    _run_cli(
+        'spread', '--stream', '--quiet', '--windows=10,100',
+        f'--csv={csv_path}', *INSTRUMENTS[:2], config_yml=config_yml
+    )
+    assert csv_path.is_file()
+
+
+def test_watch(tmp_path):
+    server = MockV20Server(tick_rate=100, n_ticks=200)
+    server.start_in_thread()
+    try:
+        res = _run_cli(
+            'watch', '--interval=0.1', 'EUR_USD',
+            config_yml=_write_config(server=server, tmp_path=tmp_path),
+            check=False
+        )
+    finally:
+        server.shutdown()
+        server.server_close()
+    assert res.returncode != 0
+    summary = json.loads(res.stdout.splitlines()[0])
+    assert {'balance', 'NAV', 'positions', 'trades'} <= set(summary)